@@ -1,5 +1,15 @@
 from django.contrib import admin
-from .models import ChatMessage, ChatSession, BotResponse
+from django.db.models import Count, IntegerField, OuterRef, Subquery
+from .models import ChatMessage, ChatSession, BotResponse, Tenant
+
+
+@admin.register(Tenant)
+class TenantAdmin(admin.ModelAdmin):
+    list_display = ['name', 'slug', 'domain', 'is_active', 'rules_version', 'created_at']
+    list_filter = ['is_active']
+    search_fields = ['name', 'slug', 'domain']
+    readonly_fields = ['rules_version', 'created_at']
+    prepopulated_fields = {'slug': ['name']}
 
 
 @admin.register(ChatMessage)
@@ -9,6 +19,7 @@ class ChatMessageAdmin(admin.ModelAdmin):
     search_fields = ['user_message', 'bot_response', 'session_id']
     readonly_fields = ['created_at']
     ordering = ['-created_at']
+    list_select_related = ['user']
     
     def session_id_short(self, obj):
         return obj.session_id[:8] + '...' if len(obj.session_id) > 8 else obj.session_id
@@ -30,19 +41,38 @@ class ChatSessionAdmin(admin.ModelAdmin):
     search_fields = ['session_id', 'user__username']
     readonly_fields = ['created_at', 'updated_at', 'message_count']
     ordering = ['-updated_at']
+    list_select_related = ['user']
+    
+    def get_queryset(self, request):
+        # Contagem de mensagens em uma subconsulta, sem uma query por sessão
+        message_total = (
+            ChatMessage.objects.filter(session_id=OuterRef('session_id'))
+            .order_by()
+            .values('session_id')
+            .annotate(total=Count('pk'))
+            .values('total')
+        )
+        return super().get_queryset(request).annotate(
+            message_total=Subquery(message_total, output_field=IntegerField())
+        )
     
     def session_id_short(self, obj):
         return obj.session_id[:8] + '...' if len(obj.session_id) > 8 else obj.session_id
     session_id_short.short_description = 'Sessão'
+    
+    def message_count(self, obj):
+        return obj.message_count or 0
+    message_count.short_description = 'Mensagens'
 
 
 @admin.register(BotResponse)
 class BotResponseAdmin(admin.ModelAdmin):
-    list_display = ['category', 'response_text_short', 'keywords_short', 'is_active', 'priority', 'created_at']
-    list_filter = ['category', 'is_active', 'priority']
+    list_display = ['category', 'response_text_short', 'keywords_short', 'tenant', 'is_active', 'priority', 'created_at']
+    list_filter = ['tenant', 'category', 'is_active', 'priority']
     search_fields = ['response_text', 'keywords']
     readonly_fields = ['created_at']
     ordering = ['priority', 'category']
+    list_select_related = ['tenant']
     
     def response_text_short(self, obj):
         return obj.response_text[:50] + '...' if len(obj.response_text) > 50 else obj.response_text
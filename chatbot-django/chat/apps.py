@@ -5,3 +5,9 @@ class ChatConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'chat'
     verbose_name = 'Chat Bot'
+
+    def ready(self):
+        from . import rules, signals  # noqa: F401
+        
+        # Carregar a tabela de regras compilada antes do primeiro request
+        rules.warmup()
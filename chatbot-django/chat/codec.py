@@ -0,0 +1,96 @@
+"""
+Codificação JSON das requisições e respostas do chat.
+
+Usa o orjson quando instalado e o json da biblioteca padrão caso contrário.
+O corpo das requisições é limitado antes de qualquer parsing e listas grandes
+podem ser codificadas em partes, sem montar a resposta inteira na memória.
+
+O mesmo módulo existe no chatbot-flask (codec.py); mantenha os dois iguais.
+"""
+import json
+
+try:
+    import orjson
+except ImportError:  # pragma: no cover - depende do ambiente
+    orjson = None
+
+BACKEND = 'orjson' if orjson is not None else 'json'
+
+MAX_BODY_SIZE = 4096
+MAX_MESSAGE_LENGTH = 500
+
+
+class CodecError(ValueError):
+    """Requisição rejeitada; `status` é o código HTTP a devolver"""
+
+    def __init__(self, message, status=400):
+        super().__init__(message)
+        self.message = message
+        self.status = status
+
+
+if orjson is not None:
+    def loads(data):
+        return orjson.loads(data)
+
+    def dumps(obj):
+        """Codificar em JSON (bytes UTF-8)"""
+        return orjson.dumps(obj)
+else:
+    def loads(data):
+        return json.loads(data)
+
+    def dumps(obj):
+        """Codificar em JSON (bytes UTF-8)"""
+        return json.dumps(obj, ensure_ascii=False, separators=(',', ':')).encode('utf-8')
+
+
+def check_content_length(content_length, max_body_size=MAX_BODY_SIZE):
+    """Rejeitar pelo cabeçalho Content-Length, antes de ler o corpo"""
+    try:
+        length = int(content_length or 0)
+    except (TypeError, ValueError):
+        raise CodecError('Content-Length inválido')
+    if length > max_body_size:
+        raise CodecError('Requisição muito grande', status=413)
+
+
+def decode_chat_request(body, max_body_size=MAX_BODY_SIZE, max_message_length=MAX_MESSAGE_LENGTH):
+    """
+    Validar e decodificar o corpo de uma mensagem do chat
+
+    Retorna o objeto JSON com `message` já sem espaços nas pontas.
+    """
+    if len(body) > max_body_size:
+        raise CodecError('Requisição muito grande', status=413)
+
+    try:
+        data = loads(body)
+    except ValueError:
+        raise CodecError('JSON inválido')
+    if not isinstance(data, dict):
+        raise CodecError('JSON inválido')
+
+    message = data.get('message') or ''
+    if not isinstance(message, str):
+        raise CodecError('Mensagem inválida')
+    message = message.strip()
+    if len(message) > max_message_length:
+        raise CodecError(f'Mensagem muito longa (máximo {max_message_length} caracteres)', status=413)
+
+    data['message'] = message
+    return data
+
+
+def iter_encode_list(key, items, extra=None):
+    """
+    Codificar {key: [...items], **extra} em partes, item a item
+
+    Para respostas em streaming: nenhum momento exige a lista inteira
+    codificada na memória.
+    """
+    head = dumps(extra or {})[:-1]
+    yield head + (b',' if len(head) > 1 else b'') + dumps(key) + b':['
+    for index, item in enumerate(items):
+        yield (b',' if index else b'') + dumps(item)
+    yield b']}'
@@ -0,0 +1,45 @@
+import json
+import timeit
+
+from django.core.management.base import BaseCommand
+
+from chat import codec
+
+
+class Command(BaseCommand):
+    help = 'Micro-benchmark do codec JSON do chat (backend ativo vs. json da biblioteca padrão)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--number', type=int, default=20000, help='Iterações por medição')
+
+    def handle(self, *args, **options):
+        number = options['number']
+        body = json.dumps({'message': 'Olá, que horas são? ' * 10, 'session_id': 'x' * 36}).encode()
+        reply = {'response': 'Agora são 12:00 do dia 01/01/2025.', 'session_id': 'x' * 36, 'timestamp': 1.0}
+        history = {'messages': [
+            {'user_message': f'Mensagem {i}', 'bot_response': 'Resposta ' * 10, 'timestamp': '2025-01-01T12:00:00'}
+            for i in range(100)
+        ]}
+
+        def stdlib_request():
+            data = json.loads(body)
+            data['message'].strip()
+            return json.dumps(reply).encode()
+
+        def codec_request():
+            codec.decode_chat_request(body)
+            return codec.dumps(reply)
+
+        cases = [
+            ('api/chat/ (decode + encode)', stdlib_request, codec_request),
+            ('api/history/ (100 mensagens)', lambda: json.dumps(history).encode(), lambda: codec.dumps(history)),
+        ]
+
+        self.stdout.write(f'Backend ativo: {codec.BACKEND}')
+        for name, baseline, candidate in cases:
+            baseline_us = min(timeit.repeat(baseline, number=number, repeat=3)) / number * 1e6
+            candidate_us = min(timeit.repeat(candidate, number=number, repeat=3)) / number * 1e6
+            self.stdout.write(
+                f'{name}: json {baseline_us:.2f} µs, {codec.BACKEND} {candidate_us:.2f} µs '
+                f'(economia de {baseline_us - candidate_us:.2f} µs por requisição)'
+            )
@@ -0,0 +1,25 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from chat.rules import publish_rule_table
+
+
+class Command(BaseCommand):
+    help = 'Compila as regras ativas do bot no arquivo binário compartilhado pelos workers'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--output',
+            help='Caminho do arquivo compilado (padrão: settings.CHAT_RULES_FILE)',
+        )
+
+    def handle(self, *args, **options):
+        path = options['output'] or settings.CHAT_RULES_FILE
+        if not path:
+            raise CommandError('Defina CHAT_RULES_FILE ou use --output')
+
+        table = publish_rule_table(path)
+        self.stdout.write(self.style.SUCCESS(
+            f'{len(table)} regras compiladas em {path} '
+            f'(versão {table.version}, {table.size} bytes)'
+        ))
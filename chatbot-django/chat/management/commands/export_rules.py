@@ -0,0 +1,28 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from chat.models import BotResponse, Tenant
+from chat.rule_io import FORMATS, export_rules, guess_format
+
+
+class Command(BaseCommand):
+    help = 'Exporta as regras do bot para um arquivo JSONL ou CSV'
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', help='Arquivo de saída')
+        parser.add_argument('--format', choices=FORMATS, help='Formato (padrão: pela extensão)')
+        parser.add_argument('--tenant', help='Slug do cliente (padrão: regras globais)')
+
+    def handle(self, *args, **options):
+        path = options['path']
+        fmt = options['format'] or guess_format(path)
+        tenant = None
+        if options['tenant']:
+            tenant = Tenant.objects.filter(slug=options['tenant']).first()
+            if tenant is None:
+                raise CommandError(f"Cliente não encontrado: {options['tenant']}")
+        queryset = BotResponse.objects.filter(tenant=tenant)
+
+        with open(path, 'w', newline='', encoding='utf-8') as stream:
+            count = export_rules(stream, fmt, queryset)
+
+        self.stdout.write(self.style.SUCCESS(f'{count} regras exportadas para {path}'))
@@ -0,0 +1,37 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from chat.models import Tenant
+from chat.rule_io import FORMATS, RuleImportError, guess_format, import_rules
+
+
+class Command(BaseCommand):
+    help = 'Importa regras do bot de um arquivo JSONL ou CSV (insere ou atualiza pelo id)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', help='Arquivo de entrada')
+        parser.add_argument('--format', choices=FORMATS, help='Formato (padrão: pela extensão)')
+        parser.add_argument('--batch-size', type=int, default=1000, help='Registros por lote')
+        parser.add_argument('--tenant', help='Slug do cliente (padrão: regras globais)')
+
+    def handle(self, *args, **options):
+        path = options['path']
+        fmt = options['format'] or guess_format(path)
+        tenant = None
+        if options['tenant']:
+            tenant = Tenant.objects.filter(slug=options['tenant']).first()
+            if tenant is None:
+                raise CommandError(f"Cliente não encontrado: {options['tenant']}")
+
+        try:
+            with open(path, newline='', encoding='utf-8') as stream:
+                created, updated = import_rules(
+                    stream, fmt, batch_size=options['batch_size'], tenant=tenant
+                )
+        except (OSError, RuleImportError) as e:
+            raise CommandError(str(e))
+        except UnicodeDecodeError as e:
+            raise CommandError(f'O arquivo não está em UTF-8 ({e.reason})')
+
+        self.stdout.write(self.style.SUCCESS(
+            f'{created} regras criadas, {updated} atualizadas'
+        ))
@@ -0,0 +1,26 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from chat.reaper import purge_cleared_messages
+
+
+class Command(BaseCommand):
+    help = 'Remove em lotes as mensagens de sessões de chat limpas'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=500, help='Mensagens por lote')
+        parser.add_argument('--pause', type=float, default=0.05, help='Pausa (segundos) entre lotes')
+        parser.add_argument(
+            '--loop', type=float, metavar='INTERVALO',
+            help='Continuar rodando, verificando a cada INTERVALO segundos',
+        )
+
+    def handle(self, *args, **options):
+        while True:
+            deleted = purge_cleared_messages(options['batch_size'], options['pause'])
+            if deleted or options['verbosity'] > 1:
+                self.stdout.write(f'{deleted} mensagens removidas')
+            if options['loop'] is None:
+                break
+            time.sleep(options['loop'])
@@ -3,6 +3,39 @@ from django.contrib.auth.models import User
 from django.utils import timezone
 
 
+class Tenant(models.Model):
+    """
+    Modelo para clientes (marcas) atendidos pelo bot, cada um com suas regras
+    """
+    name = models.CharField(max_length=100, verbose_name="Nome")
+    slug = models.SlugField(unique=True, verbose_name="Identificador")
+    domain = models.CharField(
+        max_length=255, unique=True, null=True, blank=True,
+        help_text="Host atendido por este cliente (ex.: chat.cliente.com)", verbose_name="Domínio"
+    )
+    is_active = models.BooleanField(default=True, verbose_name="Ativo")
+    rules_version = models.PositiveIntegerField(default=0, editable=False, verbose_name="Versão das regras")
+    created_at = models.DateTimeField(default=timezone.now, verbose_name="Criado em")
+    
+    class Meta:
+        verbose_name = "Cliente"
+        verbose_name_plural = "Clientes"
+        ordering = ['name']
+    
+    def __str__(self):
+        return self.name
+
+
+class ChatMessageQuerySet(models.QuerySet):
+    def visible(self):
+        """Excluir mensagens ocultadas pela limpeza da sessão (aguardando remoção)"""
+        cleared = ChatSession.objects.filter(
+            session_id=models.OuterRef('session_id'),
+            cleared_at__gte=models.OuterRef('created_at')
+        )
+        return self.exclude(models.Exists(cleared))
+
+
 class ChatMessage(models.Model):
     """
     Modelo para armazenar mensagens do chat
@@ -13,10 +46,15 @@ class ChatMessage(models.Model):
     session_id = models.CharField(max_length=100, verbose_name="ID da Sessão")
     created_at = models.DateTimeField(default=timezone.now, verbose_name="Criado em")
     
+    objects = ChatMessageQuerySet.as_manager()
+    
     class Meta:
         verbose_name = "Mensagem do Chat"
         verbose_name_plural = "Mensagens do Chat"
         ordering = ['-created_at']
+        indexes = [
+            models.Index(fields=['session_id', 'created_at']),
+        ]
     
     def __str__(self):
         return f"Chat {self.session_id[:8]} - {self.created_at.strftime('%d/%m/%Y %H:%M')}"
@@ -28,9 +66,15 @@ class ChatSession(models.Model):
     """
     session_id = models.CharField(max_length=100, unique=True, verbose_name="ID da Sessão")
     user = models.ForeignKey(User, on_delete=models.CASCADE, null=True, blank=True)
+    tenant = models.ForeignKey(Tenant, on_delete=models.CASCADE, null=True, blank=True, verbose_name="Cliente")
     created_at = models.DateTimeField(default=timezone.now, verbose_name="Criado em")
     updated_at = models.DateTimeField(auto_now=True, verbose_name="Atualizado em")
     is_active = models.BooleanField(default=True, verbose_name="Ativo")
+    cleared_at = models.DateTimeField(
+        null=True, blank=True,
+        help_text="Mensagens até este momento ficam ocultas e são removidas em segundo plano (depois disso fica vazio)",
+        verbose_name="Limpo em"
+    )
     
     class Meta:
         verbose_name = "Sessão do Chat"
@@ -42,7 +86,10 @@ class ChatSession(models.Model):
     
     @property
     def message_count(self):
-        return self.chatmessage_set.count()
+        # Na listagem do admin o valor já vem anotado na consulta
+        if hasattr(self, 'message_total'):
+            return self.message_total
+        return ChatMessage.objects.filter(session_id=self.session_id).count()
 
 
 class BotResponse(models.Model):
@@ -60,6 +107,10 @@ class BotResponse(models.Model):
         ('other', 'Outros'),
     ]
     
+    tenant = models.ForeignKey(
+        Tenant, on_delete=models.CASCADE, null=True, blank=True,
+        help_text="Vazio para regras globais", verbose_name="Cliente"
+    )
     category = models.CharField(max_length=20, choices=CATEGORY_CHOICES, verbose_name="Categoria")
     keywords = models.TextField(help_text="Palavras-chave separadas por vírgula", verbose_name="Palavras-chave")
     response_text = models.TextField(verbose_name="Texto da Resposta")
@@ -75,5 +126,17 @@ class BotResponse(models.Model):
     def __str__(self):
         return f"{self.get_category_display()} - {self.response_text[:50]}..."
     
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        # Cliente gravado no banco, para saber se a regra mudou de cliente
+        if 'tenant_id' in instance.__dict__:
+            instance._loaded_tenant_id = instance.tenant_id
+        return instance
+    
     def get_keywords_list(self):
-        return [keyword.strip().lower() for keyword in self.keywords.split(',') if keyword.strip()]
+        return self.parse_keywords(self.keywords)
+    
+    @staticmethod
+    def parse_keywords(keywords):
+        return [keyword.strip().lower() for keyword in keywords.split(',') if keyword.strip()]
@@ -0,0 +1,160 @@
+"""
+Respostas dinâmicas do bot.
+
+Textos de resposta podem ter placeholders (ex.: "Agora são {hora}.") que são
+preenchidos pelo provedor configurado para a categoria da regra em
+settings.CHAT_RESPONSE_PROVIDERS. O resultado de cada provedor fica em cache
+por `ttl` segundos e, quando várias requisições encontram o cache vencido ao
+mesmo tempo, só uma calcula o valor e as demais aguardam o resultado.
+"""
+import functools
+import json
+import logging
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import Future
+
+from django.conf import settings
+from django.utils import timezone
+from django.utils.module_loading import import_string
+
+logger = logging.getLogger(__name__)
+
+
+class TTLCache:
+    """
+    Cache em memória com expiração e cálculo único por chave (single-flight)
+
+    Com `maxsize`, ao passar do limite as entradas vencidas são removidas e,
+    se ainda não bastar, as menos usadas recentemente.
+    """
+
+    def __init__(self, maxsize=None):
+        self._lock = threading.Lock()
+        self._values = OrderedDict()
+        self._inflight = {}
+        self.maxsize = maxsize
+
+    def get_or_compute(self, key, ttl, compute):
+        """Retornar o valor em cache ou calculá-lo uma única vez"""
+        with self._lock:
+            entry = self._values.get(key)
+            if entry is not None and entry[0] > time.monotonic():
+                self._values.move_to_end(key)
+                return entry[1]
+
+            future = self._inflight.get(key)
+            leader = future is None
+            if leader:
+                future = self._inflight[key] = Future()
+
+        if not leader:
+            return future.result()
+
+        try:
+            value = compute()
+        except BaseException as e:
+            with self._lock:
+                del self._inflight[key]
+            future.set_exception(e)
+            raise
+
+        with self._lock:
+            self._values[key] = (time.monotonic() + ttl, value)
+            self._values.move_to_end(key)
+            del self._inflight[key]
+            if self.maxsize is not None and len(self._values) > self.maxsize:
+                self._prune()
+        future.set_result(value)
+        return value
+
+    def _prune(self):
+        now = time.monotonic()
+        for key in [key for key, entry in self._values.items() if entry[0] <= now]:
+            del self._values[key]
+        while len(self._values) > self.maxsize:
+            self._values.popitem(last=False)
+
+    def discard(self, key):
+        with self._lock:
+            self._values.pop(key, None)
+
+    def clear(self):
+        with self._lock:
+            self._values.clear()
+
+
+class Provider:
+    """Base dos provedores: `get_context` retorna os valores dos placeholders"""
+    ttl = 60
+
+    def get_context(self):
+        raise NotImplementedError
+
+
+class ClockProvider(Provider):
+    """Data e hora atuais no fuso do projeto"""
+    ttl = 1
+
+    def get_context(self):
+        now = timezone.localtime()
+        return {
+            'hora': now.strftime('%H:%M'),
+            'data': now.strftime('%d/%m/%Y'),
+        }
+
+
+class StubWeatherProvider(Provider):
+    """Clima fixo, para desenvolvimento e testes"""
+    ttl = 3600
+
+    def get_context(self):
+        return {
+            'cidade': 'São Paulo',
+            'temperatura': '25',
+            'condicao': 'ensolarado',
+        }
+
+
+class WeatherFileProvider(Provider):
+    """Clima lido de um arquivo JSON local (settings.CHAT_WEATHER_FILE)"""
+    ttl = 300
+
+    def get_context(self):
+        with open(settings.CHAT_WEATHER_FILE, encoding='utf-8') as f:
+            data = json.load(f)
+        return {key: str(value) for key, value in data.items()}
+
+
+class _Placeholders(dict):
+    """Mantém no texto os placeholders sem valor"""
+
+    def __missing__(self, key):
+        return '{' + key + '}'
+
+
+cache = TTLCache()
+
+
+@functools.lru_cache(maxsize=None)
+def load_provider(path):
+    return import_string(path)()
+
+
+def render_response(category, text):
+    """Preencher os placeholders da resposta com o provedor da categoria"""
+    if '{' not in text:
+        return text
+
+    path = settings.CHAT_RESPONSE_PROVIDERS.get(category)
+    if path is None:
+        return text
+
+    try:
+        provider = load_provider(path)
+        context = cache.get_or_compute(path, provider.ttl, provider.get_context)
+        return text.format_map(_Placeholders(context))
+    except Exception:
+        logger.exception('Falha ao preencher resposta dinâmica (%s)', category)
+        return text
@@ -0,0 +1,49 @@
+"""
+Remoção em segundo plano das mensagens de sessões limpas.
+
+Limpar o chat só marca a sessão (ChatSession.cleared_at). As mensagens
+ocultas são apagadas aqui em lotes pequenos, cada um em sua própria
+transação e com pausas entre eles, para que o lock de escrita do banco
+fique preso por pouco tempo e outras gravações continuem fluindo. Os ids
+de cada lote são escolhidos numa consulta de leitura, fora da transação,
+e a sessão sem mais nada a remover volta a ter cleared_at vazio, saindo
+das próximas varreduras.
+"""
+import time
+
+from django.db import transaction
+
+from .models import ChatMessage, ChatSession
+
+
+def purge_cleared_messages(batch_size=500, pause=0.05, max_batches=None):
+    """
+    Apagar as mensagens ocultas em lotes de `batch_size`
+
+    Retorna o número de mensagens apagadas. Para quando não há mais o que
+    apagar ou após `max_batches` lotes.
+    """
+    sessions = list(
+        ChatSession.objects.filter(cleared_at__isnull=False)
+        .values_list('pk', 'session_id', 'cleared_at')
+    )
+
+    total = batches = 0
+    for pk, session_id, cleared_at in sessions:
+        hidden = ChatMessage.objects.filter(session_id=session_id, created_at__lte=cleared_at)
+        while True:
+            if max_batches is not None and batches >= max_batches:
+                return total
+            ids = list(hidden.order_by().values_list('pk', flat=True)[:batch_size])
+            if ids:
+                with transaction.atomic():
+                    deleted, _ = ChatMessage.objects.filter(pk__in=ids).delete()
+                total += deleted
+                batches += 1
+            if len(ids) < batch_size:
+                # Só desmarca se a sessão não foi limpa de novo nesse meio tempo
+                ChatSession.objects.filter(pk=pk, cleared_at=cleared_at).update(cleared_at=None)
+                break
+            if pause:
+                time.sleep(pause)
+    return total
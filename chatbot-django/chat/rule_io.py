@@ -0,0 +1,178 @@
+"""
+Importação e exportação em streaming das regras do bot (JSONL ou CSV).
+
+Os registros são lidos e escritos um a um, e a importação grava em lotes
+com bulk_create/bulk_update, então o uso de memória não cresce com o
+tamanho do arquivo.
+"""
+import csv
+import json
+
+from django.db import transaction
+
+from .models import BotResponse
+from .rules import rules_changed
+
+FIELDS = ['id', 'category', 'keywords', 'response_text', 'is_active', 'priority']
+UPDATE_FIELDS = ['category', 'keywords', 'response_text', 'is_active', 'priority']
+FORMATS = ['jsonl', 'csv']
+
+CATEGORIES = {choice for choice, _ in BotResponse.CATEGORY_CHOICES}
+MAX_KEYWORD_LENGTH = 100
+
+
+class RuleImportError(ValueError):
+    """Registro inválido no arquivo de regras"""
+
+    def __init__(self, line, message):
+        super().__init__(f'Linha {line}: {message}')
+        self.line = line
+
+
+def guess_format(path):
+    """Descobrir o formato pela extensão do arquivo"""
+    if str(path).lower().endswith('.csv'):
+        return 'csv'
+    return 'jsonl'
+
+
+def read_records(stream, fmt):
+    """Gerar (linha, registro) a partir de um arquivo JSONL ou CSV"""
+    if fmt == 'csv':
+        reader = csv.DictReader(stream)
+        for record in reader:
+            yield reader.line_num, record
+        return
+
+    for line, text in enumerate(stream, start=1):
+        if not text.strip():
+            continue
+        try:
+            record = json.loads(text)
+        except json.JSONDecodeError as e:
+            raise RuleImportError(line, f'JSON inválido ({e.msg})')
+        if not isinstance(record, dict):
+            raise RuleImportError(line, 'cada linha deve ser um objeto JSON')
+        yield line, record
+
+
+def _parse_bool(value):
+    if isinstance(value, bool):
+        return value
+    return str(value).strip().lower() in ('1', 'true', 'sim', 'yes', 't')
+
+
+def _text(line, record, field):
+    value = record.get(field)
+    if value is None:
+        return ''
+    if not isinstance(value, str):
+        raise RuleImportError(line, f'{field} deve ser um texto')
+    return value
+
+
+def validate_record(line, record, tenant=None):
+    """Validar um registro e convertê-lo em BotResponse (sem salvar)"""
+    category = _text(line, record, 'category').strip()
+    if category not in CATEGORIES:
+        raise RuleImportError(line, f'categoria inválida: {category!r}')
+
+    keywords = BotResponse.parse_keywords(_text(line, record, 'keywords'))
+    if not keywords:
+        raise RuleImportError(line, 'nenhuma palavra-chave informada')
+    for keyword in keywords:
+        if len(keyword) > MAX_KEYWORD_LENGTH:
+            raise RuleImportError(line, f'palavra-chave muito longa: {keyword[:20]!r}...')
+
+    response_text = _text(line, record, 'response_text').strip()
+    if not response_text:
+        raise RuleImportError(line, 'texto da resposta vazio')
+
+    try:
+        pk = int(record['id']) if record.get('id') not in (None, '') else None
+        priority = int(record['priority']) if record.get('priority') not in (None, '') else 1
+    except (TypeError, ValueError):
+        raise RuleImportError(line, 'id e prioridade devem ser números inteiros')
+
+    is_active = record.get('is_active')
+    return BotResponse(
+        pk=pk,
+        tenant=tenant,
+        category=category,
+        keywords=', '.join(keywords),
+        response_text=response_text,
+        is_active=True if is_active in (None, '') else _parse_bool(is_active),
+        priority=priority,
+    )
+
+
+def _flush(batch):
+    """Gravar um lote de (linha, regra); ids só atualizam regras do mesmo cliente"""
+    ids = [rule.pk for _, rule in batch if rule.pk is not None]
+    owners = dict(BotResponse.objects.filter(pk__in=ids).values_list('pk', 'tenant_id'))
+    for line, rule in batch:
+        if rule.pk in owners and owners[rule.pk] != rule.tenant_id:
+            raise RuleImportError(line, f'a regra {rule.pk} pertence a outro cliente')
+
+    to_update = [rule for _, rule in batch if rule.pk in owners]
+    to_create = [rule for _, rule in batch if rule.pk not in owners]
+    if to_update:
+        BotResponse.objects.bulk_update(to_update, UPDATE_FIELDS)
+    if to_create:
+        BotResponse.objects.bulk_create(to_create)
+    return len(to_create), len(to_update)
+
+
+def import_rules(stream, fmt, batch_size=1000, tenant=None):
+    """
+    Inserir ou atualizar (pelo id) as regras do arquivo no cliente
+    `tenant` (None para regras globais)
+
+    Tudo roda em uma única transação: qualquer registro inválido (inclusive
+    um id repetido no arquivo ou de regra de outro cliente) desfaz a
+    importação inteira. A versão do conjunto de regras é atualizada uma
+    única vez, ao final.
+    """
+    created = updated = 0
+    seen = {}
+    with transaction.atomic():
+        batch = []
+        for line, record in read_records(stream, fmt):
+            rule = validate_record(line, record, tenant)
+            if rule.pk is not None:
+                if rule.pk in seen:
+                    raise RuleImportError(line, f'id {rule.pk} repetido (já usado na linha {seen[rule.pk]})')
+                seen[rule.pk] = line
+            batch.append((line, rule))
+            if len(batch) >= batch_size:
+                c, u = _flush(batch)
+                created, updated = created + c, updated + u
+                batch = []
+        if batch:
+            c, u = _flush(batch)
+            created, updated = created + c, updated + u
+
+        rules_changed(tenant.pk if tenant else None)
+
+    return created, updated
+
+
+def export_rules(stream, fmt, queryset=None, chunk_size=2000):
+    """Escrever as regras no arquivo, uma por linha"""
+    if queryset is None:
+        queryset = BotResponse.objects.all()
+    rows = queryset.order_by('pk').values(*FIELDS).iterator(chunk_size=chunk_size)
+
+    count = 0
+    if fmt == 'csv':
+        writer = csv.DictWriter(stream, fieldnames=FIELDS)
+        writer.writeheader()
+        for row in rows:
+            writer.writerow(row)
+            count += 1
+    else:
+        for row in rows:
+            stream.write(json.dumps(row, ensure_ascii=False))
+            stream.write('\n')
+            count += 1
+    return count
@@ -0,0 +1,563 @@
+"""
+Tabela de regras compilada do bot.
+
+As regras ativas de BotResponse são compiladas (manage.py compile_rules) em
+um arquivo binário versionado. Cada worker mapeia o arquivo em memória
+somente leitura, então o sistema operacional compartilha uma única cópia
+entre os processos. Quando um novo arquivo é publicado (troca atômica via
+os.replace) os workers detectam a mudança e passam a usar a nova versão.
+
+As palavras-chave ficam em tabelas hash dentro do próprio arquivo, lidas
+direto do buffer mapeado, sem copiar as palavras para a memória do processo.
+Uma segunda tabela, indexada pelos PREFIX primeiros bytes das palavras,
+diz quais tamanhos de palavra começam com cada prefixo; assim cada posição
+da mensagem consulta só os tamanhos possíveis ali.
+
+Formato (little-endian):
+    cabeçalho   magic, versão do formato, versão do conjunto de regras,
+                número de regras, de posições das tabelas hash e de tamanhos
+    regras      pk, prioridade, categoria e resposta (offset/tamanho)
+    tamanhos    tamanhos distintos (em bytes) das palavras-chave, crescentes
+    palavras    crc32, índice da regra + 1 (0 = vazia), palavra (offset/tamanho)
+    prefixos    prefixo, máscara dos tamanhos longos que começam com ele
+                (bit i = i-ésimo tamanho >= PREFIX; o bit 63 cobre os demais)
+    textos      strings UTF-8 referenciadas pelos offsets
+"""
+import logging
+import mmap
+import os
+import struct
+import tempfile
+import threading
+import time
+import zlib
+from collections import OrderedDict, namedtuple
+from concurrent.futures import Future
+from pathlib import Path
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import F
+
+from .models import BotResponse, Tenant
+
+logger = logging.getLogger(__name__)
+
+MAGIC = b'CHRT'
+FORMAT_VERSION = 3
+
+HEADER = struct.Struct('<4sHxxQIIII')
+RULE = struct.Struct('<qiIIII')
+LENGTH = struct.Struct('<H')
+SLOT = struct.Struct('<IIII')
+PREFIX_SLOT = struct.Struct('<4sQ')
+
+# Tamanho (em bytes) do prefixo usado para escolher os tamanhos a consultar
+PREFIX = 4
+
+Rule = namedtuple('Rule', ['pk', 'priority', 'category', 'response_text'])
+
+
+class RuleTableError(ValueError):
+    """Arquivo de regras inválido ou de formato incompatível"""
+
+
+def build_rule_table(queryset=None, version=None):
+    """
+    Compilar as regras ativas (globais, por padrão) em bytes no formato da tabela
+
+    As regras ficam na mesma ordem usada na busca (prioridade, pk); cada
+    palavra-chave aponta para a primeira regra que a usa, e a busca escolhe
+    a regra de menor índice entre as palavras encontradas na mensagem.
+    """
+    if queryset is None:
+        queryset = BotResponse.objects.filter(is_active=True, tenant__isnull=True)
+    if version is None:
+        version = time.time_ns()
+
+    rows = queryset.order_by('priority', 'pk').values_list(
+        'pk', 'priority', 'category', 'keywords', 'response_text'
+    )
+
+    strings = bytearray()
+    rules = bytearray()
+    keywords = {}
+
+    def add_string(data):
+        offset = len(strings)
+        strings.extend(data)
+        return offset, len(data)
+
+    count = 0
+    for pk, priority, category, keyword_text, response_text in rows.iterator(chunk_size=2000):
+        category_offset, category_length = add_string(category.encode('utf-8'))
+        response_offset, response_length = add_string(response_text.encode('utf-8'))
+        rules.extend(RULE.pack(
+            pk, priority, category_offset, category_length, response_offset, response_length
+        ))
+        for keyword in BotResponse.parse_keywords(keyword_text):
+            keywords.setdefault(keyword.encode('utf-8'), count)
+        count += 1
+
+    lengths = sorted({len(keyword) for keyword in keywords})
+    long_bits = {
+        length: 1 << min(index, 63)
+        for index, length in enumerate(length for length in lengths if length >= PREFIX)
+    }
+    prefixes = {}
+    for keyword in keywords:
+        if len(keyword) >= PREFIX:
+            prefix = keyword[:PREFIX]
+            prefixes[prefix] = prefixes.get(prefix, 0) | long_bits[len(keyword)]
+
+    slots = _hash_table(
+        (zlib.crc32(keyword), SLOT.pack(zlib.crc32(keyword), rule_index + 1, *add_string(keyword)))
+        for keyword, rule_index in keywords.items()
+    )
+    prefix_slots = _hash_table(
+        (zlib.crc32(prefix), PREFIX_SLOT.pack(prefix, mask)) for prefix, mask in prefixes.items()
+    )
+
+    header = HEADER.pack(
+        MAGIC, FORMAT_VERSION, version, count, len(slots), len(lengths), len(prefix_slots)
+    )
+    empty = SLOT.pack(0, 0, 0, 0)
+    empty_prefix = PREFIX_SLOT.pack(b'', 0)
+    return b''.join([
+        header,
+        rules,
+        b''.join(LENGTH.pack(length) for length in lengths),
+        b''.join(slot or empty for slot in slots),
+        b''.join(slot or empty_prefix for slot in prefix_slots),
+        strings,
+    ])
+
+
+def _hash_table(entries):
+    """
+    Montar uma tabela com endereçamento aberto (sondagem linear), no máximo
+    metade ocupada, a partir de pares (hash, registro)
+    """
+    entries = list(entries)
+    size = 1
+    while size < len(entries) * 2:
+        size *= 2
+    table = [None] * size
+    for checksum, record in entries:
+        slot = checksum & (size - 1)
+        while table[slot] is not None:
+            slot = (slot + 1) & (size - 1)
+        table[slot] = record
+    return table
+
+
+def publish_rule_table(path=None, queryset=None):
+    """
+    Compilar as regras e publicar o arquivo de forma atômica
+
+    O arquivo é escrito ao lado do destino e trocado com os.replace, assim
+    os workers nunca veem um arquivo pela metade e os que ainda mapeiam a
+    versão anterior continuam com ela até recarregar.
+    """
+    path = Path(path or settings.CHAT_RULES_FILE)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    data = build_rule_table(queryset)
+
+    fd, tmp_path = tempfile.mkstemp(dir=path.parent, prefix=f'.{path.name}.')
+    try:
+        with os.fdopen(fd, 'wb') as tmp:
+            tmp.write(data)
+            tmp.flush()
+            os.fsync(tmp.fileno())
+        os.replace(tmp_path, path)
+    except BaseException:
+        os.unlink(tmp_path)
+        raise
+
+    return RuleTable(data)
+
+
+class RuleTable:
+    """
+    Tabela de regras compilada sobre um buffer (bytes ou mmap)
+
+    Só os tamanhos distintos das palavras-chave (poucas dezenas de inteiros)
+    ficam no processo; palavras, regras e respostas são lidas do
+    buffer quando necessárias.
+    """
+
+    def __init__(self, buffer):
+        if len(buffer) < HEADER.size:
+            raise RuleTableError('Arquivo de regras truncado')
+
+        magic, format_version, version, rule_count, slot_count, length_count, prefix_count = (
+            HEADER.unpack_from(buffer, 0)
+        )
+        if magic != MAGIC:
+            raise RuleTableError('Arquivo de regras inválido')
+        if format_version != FORMAT_VERSION:
+            raise RuleTableError(f'Formato de regras não suportado: {format_version}')
+        if slot_count & (slot_count - 1) or prefix_count & (prefix_count - 1):
+            raise RuleTableError('Arquivo de regras inválido')
+
+        self.buffer = buffer
+        self.version = version
+        self.rule_count = rule_count
+        self._rules_offset = HEADER.size
+        lengths_offset = self._rules_offset + rule_count * RULE.size
+        self._slots_offset = lengths_offset + length_count * LENGTH.size
+        self._slot_mask = slot_count - 1
+        self._prefixes_offset = self._slots_offset + slot_count * SLOT.size
+        self._prefix_mask = prefix_count - 1
+        self._strings_offset = self._prefixes_offset + prefix_count * PREFIX_SLOT.size
+        if len(buffer) < self._strings_offset:
+            raise RuleTableError('Arquivo de regras truncado')
+
+        self.lengths = tuple(
+            LENGTH.unpack_from(buffer, lengths_offset + index * LENGTH.size)[0]
+            for index in range(length_count)
+        )
+        self._short_lengths = tuple(length for length in self.lengths if length < PREFIX)
+        self._long_lengths = tuple(length for length in self.lengths if length >= PREFIX)
+
+    def __len__(self):
+        return self.rule_count
+
+    @property
+    def size(self):
+        """Tamanho do buffer compilado em bytes"""
+        return len(self.buffer)
+
+    def _text(self, offset, length):
+        start = self._strings_offset + offset
+        return bytes(self.buffer[start:start + length]).decode('utf-8')
+
+    def rule(self, index):
+        """Ler a regra de índice `index` do buffer"""
+        pk, priority, category_offset, category_length, response_offset, response_length = (
+            RULE.unpack_from(self.buffer, self._rules_offset + index * RULE.size)
+        )
+        return Rule(
+            pk,
+            priority,
+            self._text(category_offset, category_length),
+            self._text(response_offset, response_length),
+        )
+
+    def _lookup(self, keyword):
+        """Índice da regra da palavra-chave (bytes) ou None"""
+        buffer = self.buffer
+        checksum = zlib.crc32(keyword)
+        slot = checksum & self._slot_mask
+        while True:
+            slot_checksum, rule, offset, length = SLOT.unpack_from(
+                buffer, self._slots_offset + slot * SLOT.size
+            )
+            if not rule:
+                return None
+            if slot_checksum == checksum and length == len(keyword):
+                start = self._strings_offset + offset
+                if buffer[start:start + length] == keyword:
+                    return rule - 1
+            slot = (slot + 1) & self._slot_mask
+
+    def _prefix_lengths(self, prefix):
+        """Máscara dos tamanhos longos que começam com `prefix` (0 se nenhum)"""
+        buffer = self.buffer
+        slot = zlib.crc32(prefix) & self._prefix_mask
+        while True:
+            stored, mask = PREFIX_SLOT.unpack_from(
+                buffer, self._prefixes_offset + slot * PREFIX_SLOT.size
+            )
+            if not mask or stored == prefix:
+                return mask
+            slot = (slot + 1) & self._prefix_mask
+
+    def _candidates(self, data):
+        """Gerar os trechos da mensagem que podem ser palavras-chave"""
+        size = len(data)
+        for length in self._short_lengths:
+            for start in range(size - length + 1):
+                yield data[start:start + length]
+
+        long_lengths = self._long_lengths
+        for start in range(size - PREFIX + 1):
+            mask = self._prefix_lengths(data[start:start + PREFIX])
+            while mask:
+                bit = mask & -mask
+                mask ^= bit
+                index = bit.bit_length() - 1
+                for length in long_lengths[index:index + 1] if index < 63 else long_lengths[63:]:
+                    if start + length > size:
+                        break
+                    yield data[start:start + length]
+
+    def match(self, message):
+        """
+        Retornar a regra de maior prioridade com palavra-chave na mensagem
+
+        O custo cresce com o tamanho da mensagem e com o número de tamanhos
+        de palavra-chave que compartilham cada prefixo, não com o número de
+        regras.
+        """
+        best = None
+        for piece in self._candidates(message.encode('utf-8')):
+            rule_index = self._lookup(piece)
+            if rule_index is not None and (best is None or rule_index < best):
+                best = rule_index
+                if best == 0:
+                    break
+        return None if best is None else self.rule(best)
+
+
+def load_rule_table(path):
+    """Mapear o arquivo compilado em memória (somente leitura)"""
+    with open(path, 'rb') as f:
+        try:
+            buffer = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        except ValueError:
+            raise RuleTableError('Arquivo de regras vazio')
+    return RuleTable(buffer)
+
+
+class RuleTableLoader:
+    """
+    Mantém a tabela mapeada pelo worker e a troca quando o arquivo muda
+
+    A verificação é um os.stat limitado a uma vez a cada
+    CHAT_RULES_CHECK_INTERVAL segundos. A troca é só a substituição da
+    referência: requisições em andamento terminam com a tabela antiga, que
+    é liberada quando não houver mais referências. Um arquivo inválido é
+    registrado no log e ignorado até ser publicado de novo; enquanto isso o
+    worker continua com a tabela anterior.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._table = None
+        self._file_key = None
+        self._bad_file_key = None
+        self._path = None
+        self._checked_at = None
+
+    def get(self, force=False):
+        """Retornar a tabela atual ou None se não houver arquivo compilado"""
+        path = settings.CHAT_RULES_FILE
+        if not path:
+            return None
+
+        now = time.monotonic()
+        if (not force and self._checked_at is not None and self._path == path
+                and now - self._checked_at < settings.CHAT_RULES_CHECK_INTERVAL):
+            return self._table
+
+        with self._lock:
+            self._checked_at = now
+            self._path = path
+            try:
+                stat = os.stat(path)
+            except FileNotFoundError:
+                self._table = self._file_key = None
+                return None
+
+            file_key = (stat.st_dev, stat.st_ino, stat.st_mtime_ns, stat.st_size)
+            if file_key != self._file_key and file_key != self._bad_file_key:
+                try:
+                    self._table = load_rule_table(path)
+                except RuleTableError:
+                    logger.exception('Arquivo de regras inválido, mantendo a tabela anterior (%s)', path)
+                    self._bad_file_key = file_key
+                else:
+                    self._file_key = file_key
+            return self._table
+
+
+rule_tables = RuleTableLoader()
+
+
+class RuleIndexCache:
+    """
+    Índices de regras por cliente, compilados sob demanda
+
+    Cada cliente tem sua própria RuleTable em memória, só com as regras do
+    cliente, identificada pela versão das regras (Tenant.rules_version). As
+    regras globais não entram no índice: são buscadas uma única vez, na
+    tabela compartilhada (veja match_rules). Os índices menos usados
+    recentemente são descartados quando o total passa de
+    CHAT_RULE_INDEX_BUDGET bytes. Requisições simultâneas para um cliente
+    sem índice aguardam uma única compilação.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._indexes = OrderedDict()
+        self._inflight = {}
+        self._bytes = 0
+        self.hits = self.misses = self.evictions = 0
+        self.build_seconds = 0.0
+
+    def get(self, tenant):
+        """Retornar o índice atual das regras do cliente"""
+        key = (tenant.pk, tenant.rules_version)
+        with self._lock:
+            entry = self._indexes.get(tenant.pk)
+            if entry is not None and entry[0] == key[1]:
+                self._indexes.move_to_end(tenant.pk)
+                self.hits += 1
+                return entry[1]
+
+            self.misses += 1
+            future = self._inflight.get(key)
+            leader = future is None
+            if leader:
+                future = self._inflight[key] = Future()
+
+        if not leader:
+            return future.result()
+
+        try:
+            start = time.perf_counter()
+            table = RuleTable(build_rule_table(
+                BotResponse.objects.filter(tenant=tenant, is_active=True),
+                version=tenant.rules_version,
+            ))
+            elapsed = time.perf_counter() - start
+        except BaseException as e:
+            with self._lock:
+                del self._inflight[key]
+            future.set_exception(e)
+            raise
+
+        with self._lock:
+            del self._inflight[key]
+            self.build_seconds += elapsed
+            self._store(tenant.pk, tenant.rules_version, table)
+        future.set_result(table)
+        return table
+
+    def _entry_size(self, table):
+        return table.size
+
+    def _store(self, tenant_id, version, table):
+        previous = self._indexes.pop(tenant_id, None)
+        if previous is not None:
+            self._bytes -= self._entry_size(previous[1])
+
+        self._indexes[tenant_id] = (version, table)
+        self._bytes += self._entry_size(table)
+
+        budget = settings.CHAT_RULE_INDEX_BUDGET
+        while self._bytes > budget and len(self._indexes) > 1:
+            _, (_, evicted) = self._indexes.popitem(last=False)
+            self._bytes -= self._entry_size(evicted)
+            self.evictions += 1
+
+    def stats(self):
+        """Métricas do cache de índices"""
+        with self._lock:
+            return {
+                'indexes': len(self._indexes),
+                'bytes': self._bytes,
+                'budget_bytes': settings.CHAT_RULE_INDEX_BUDGET,
+                'hits': self.hits,
+                'misses': self.misses,
+                'evictions': self.evictions,
+                'build_ms_total': round(self.build_seconds * 1000, 3),
+            }
+
+    def clear(self):
+        with self._lock:
+            self._indexes.clear()
+            self._bytes = 0
+            self.hits = self.misses = self.evictions = 0
+            self.build_seconds = 0.0
+
+
+rule_indexes = RuleIndexCache()
+
+
+def match_global_rules(message, below_priority=None):
+    """
+    Regra global para a mensagem (já em minúsculas)
+
+    Usa a tabela compilada publicada e, sem ela, lê as regras do banco,
+    parando nas de prioridade `below_priority`.
+    """
+    table = rule_tables.get()
+    if table is not None:
+        return table.match(message)
+
+    rules = BotResponse.objects.filter(is_active=True, tenant__isnull=True)
+    if below_priority is not None:
+        rules = rules.filter(priority__lt=below_priority)
+    rows = rules.order_by('priority', 'pk').values_list(
+        'pk', 'priority', 'category', 'keywords', 'response_text'
+    )
+    for pk, priority, category, keywords, response_text in rows.iterator(chunk_size=2000):
+        if any(keyword in message for keyword in BotResponse.parse_keywords(keywords)):
+            return Rule(pk, priority, category, response_text)
+    return None
+
+
+def match_rules(message, tenant=None):
+    """
+    Regra de maior prioridade para a mensagem entre as do cliente e as globais
+
+    As regras do cliente vêm do índice dele e as globais da tabela
+    compartilhada por todos; na mesma prioridade a regra do cliente vence.
+    """
+    rule = rule_indexes.get(tenant).match(message) if tenant is not None else None
+    global_rule = match_global_rules(message, rule.priority if rule else None)
+    if global_rule is not None and (rule is None or global_rule.priority < rule.priority):
+        return global_rule
+    return rule
+
+
+def rules_changed(tenant_id=None):
+    """
+    Registrar que o conjunto de regras mudou
+
+    Para um cliente a versão das regras é incrementada e o índice é
+    recompilado no próximo uso. Para as regras globais com a tabela
+    compilada em uso, uma nova versão é publicada após o commit.
+    """
+    if tenant_id is not None:
+        Tenant.objects.filter(pk=tenant_id).update(rules_version=F('rules_version') + 1)
+    elif rule_tables.get() is not None:
+        schedule_publish()
+
+
+def _publish_after_commit():
+    try:
+        publish_rule_table()
+    except Exception:
+        logger.exception('Falha ao publicar a tabela de regras; a versão anterior continua em uso')
+
+
+def schedule_publish():
+    """
+    Publicar a tabela compilada após o commit, no máximo uma vez por transação
+
+    Alterar várias regras na mesma transação (ex.: excluir selecionados no
+    Admin) gera uma única recompilação. Falhas na publicação são registradas
+    no log em vez de chegar à requisição, cujos dados já foram gravados.
+    """
+    connection = transaction.get_connection()
+    if any(func is _publish_after_commit for _, func, _ in connection.run_on_commit):
+        return
+    transaction.on_commit(_publish_after_commit)
+
+
+def warmup():
+    """
+    Carregar a tabela compilada antes de o worker receber tráfego
+
+    Mapeia o arquivo e percorre a tabela uma vez para trazer as páginas do
+    arquivo para a memória.
+    """
+    table = rule_tables.get(force=True)
+    if table is not None:
+        table.match('')
+        for index in range(len(table)):
+            table.rule(index)
+    return table
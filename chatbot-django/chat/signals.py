@@ -0,0 +1,30 @@
+from django.db.models.signals import post_delete, post_save, pre_save
+from django.dispatch import receiver
+
+from .models import BotResponse
+from .rules import rules_changed
+
+
+@receiver(pre_save, sender=BotResponse)
+def remember_previous_tenant(sender, instance, **kwargs):
+    """Buscar o cliente gravado da regra quando ela não veio do banco"""
+    if instance.pk is None or hasattr(instance, '_loaded_tenant_id'):
+        return
+    stored = BotResponse.objects.filter(pk=instance.pk).values_list('tenant_id', flat=True)
+    for tenant_id in stored:
+        instance._loaded_tenant_id = tenant_id
+
+
+@receiver(post_save, sender=BotResponse)
+@receiver(post_delete, sender=BotResponse)
+def bot_response_changed(sender, instance, **kwargs):
+    """
+    Atualizar a versão das regras quando uma regra muda
+
+    Uma regra que mudou de cliente atualiza o cliente anterior e o novo.
+    """
+    previous = getattr(instance, '_loaded_tenant_id', instance.tenant_id)
+    if previous != instance.tenant_id:
+        rules_changed(previous)
+    rules_changed(instance.tenant_id)
+    instance._loaded_tenant_id = instance.tenant_id
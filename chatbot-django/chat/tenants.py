@@ -0,0 +1,84 @@
+"""
+Resolução do cliente (tenant) de cada requisição.
+
+O cliente vem do prefixo de caminho /t/<slug>/ ou, sem prefixo, do host da
+requisição (Tenant.domain). As consultas ficam em cache por
+CHAT_TENANT_CACHE_TTL segundos, então a versão das regras de um cliente
+pode levar esse tempo para ser percebida pelos workers. O cache guarda no
+máximo CHAT_TENANT_CACHE_SIZE entradas, e slugs desconhecidos não entram
+nele (o slug vem do caminho e pode ser qualquer coisa).
+"""
+import re
+
+from django.conf import settings
+from django.urls import get_script_prefix, set_script_prefix
+
+from .models import Tenant
+from .providers import TTLCache
+
+TENANT_PATH_RE = re.compile(r'^/t/(?P<slug>[-\w]+)(?P<path>/.*)$')
+
+_cache = TTLCache(maxsize=settings.CHAT_TENANT_CACHE_SIZE)
+
+
+def _lookup(**filters):
+    return Tenant.objects.filter(is_active=True, **filters).first()
+
+
+def get_tenant_by_slug(slug):
+    tenant = _cache.get_or_compute(
+        ('slug', slug), settings.CHAT_TENANT_CACHE_TTL, lambda: _lookup(slug=slug)
+    )
+    if tenant is None:
+        _cache.discard(('slug', slug))
+    return tenant
+
+
+def get_tenant_by_host(host):
+    return _cache.get_or_compute(
+        ('host', host), settings.CHAT_TENANT_CACHE_TTL, lambda: _lookup(domain=host)
+    )
+
+
+def get_request_tenant(request):
+    """
+    Cliente da requisição ou None (regras globais)
+
+    O cliente do prefixo de caminho já vem do middleware; o do host só é
+    consultado quando alguma view precisa dele.
+    """
+    if not hasattr(request, 'tenant'):
+        host = request.get_host().rsplit(':', 1)[0].lower()
+        request.tenant = get_tenant_by_host(host)
+    return request.tenant
+
+
+def clear_cache():
+    _cache.clear()
+
+
+class TenantMiddleware:
+    """
+    Atende /t/<slug>/... como o site do cliente <slug>
+
+    O prefixo é removido de path_info e passa a fazer parte do script
+    prefix, então reverse() e {% url %} geram links dentro do cliente.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        match = TENANT_PATH_RE.match(request.path_info)
+        if match:
+            tenant = get_tenant_by_slug(match['slug'])
+            if tenant is not None:
+                request.tenant = tenant
+                request.path_info = match['path']
+                script_prefix = get_script_prefix()
+                set_script_prefix(f"{script_prefix}t/{match['slug']}/")
+                try:
+                    return self.get_response(request)
+                finally:
+                    set_script_prefix(script_prefix)
+        return self.get_response(request)
@@ -1,9 +1,25 @@
-from django.test import TestCase, Client
+from django.test import TestCase, Client, override_settings
 from django.urls import reverse
 from django.contrib.auth.models import User
+from django.contrib.staticfiles.storage import staticfiles_storage
+from django.core.management import CommandError, call_command
 from django.utils import timezone
+from datetime import timedelta
+from pathlib import Path
+from unittest import mock
+import io
 import json
-from .models import ChatMessage, ChatSession, BotResponse
+import os
+import tempfile
+import threading
+import time
+from . import codec
+from .models import ChatMessage, ChatSession, BotResponse, Tenant
+from .providers import TTLCache, cache as provider_cache, render_response
+from .reaper import purge_cleared_messages
+from .rule_io import RuleImportError, export_rules, import_rules
+from .rules import RuleTable, build_rule_table, publish_rule_table, rule_indexes, rule_tables
+from .tenants import clear_cache as clear_tenant_cache
 
 
 class ChatModelTests(TestCase):
@@ -101,6 +117,70 @@ class ChatViewTests(TestCase):
         
         response_data = json.loads(response.content)
         self.assertIn('messages', response_data)
+    
+    def test_chat_history_conditional_get(self):
+        """Teste de 304 no histórico quando nada mudou"""
+        ChatSession.objects.create(session_id='test-session-123')
+        session = self.client.session
+        session['chat_session_id'] = 'test-session-123'
+        session.save()
+        ChatMessage.objects.create(
+            user_message='Olá', bot_response='Oi!', session_id='test-session-123'
+        )
+        
+        response = self.client.get(reverse('chat:chat_history'))
+        self.assertEqual(response.status_code, 200)
+        self.assertIn('ETag', response.headers)
+        self.assertIn('Last-Modified', response.headers)
+        
+        cached = self.client.get(
+            reverse('chat:chat_history'),
+            HTTP_IF_NONE_MATCH=response.headers['ETag']
+        )
+        self.assertEqual(cached.status_code, 304)
+        self.assertEqual(cached.content, b'')
+        
+        ChatMessage.objects.create(
+            user_message='tchau', bot_response='Até logo!', session_id='test-session-123'
+        )
+        changed = self.client.get(
+            reverse('chat:chat_history'),
+            HTTP_IF_NONE_MATCH=response.headers['ETag']
+        )
+        self.assertEqual(changed.status_code, 200)
+        self.assertEqual(len(json.loads(changed.content)['messages']), 2)
+
+
+MANIFEST_STORAGES = {
+    'default': {'BACKEND': 'django.core.files.storage.FileSystemStorage'},
+    'staticfiles': {'BACKEND': 'chatbot_project.storage.MinifiedManifestStaticFilesStorage'},
+}
+
+
+class StaticFilesTests(TestCase):
+    """Testes do pipeline de arquivos estáticos"""
+    
+    def test_collectstatic_hashes_minifies_and_compresses(self):
+        """Teste de hash, minificação e pré-compressão no collectstatic"""
+        with tempfile.TemporaryDirectory() as static_root:
+            with override_settings(STATIC_ROOT=static_root, STORAGES=MANIFEST_STORAGES):
+                call_command('collectstatic', interactive=False, verbosity=0)
+                url = staticfiles_storage.url('css/style.css')
+            
+            hashed = Path(static_root) / Path(url).relative_to('/static/')
+            self.assertNotEqual(hashed.name, 'style.css')
+            self.assertTrue(Path(f'{hashed}.gz').exists())
+            self.assertTrue(Path(f'{hashed}.br').exists())
+            
+            original = Path(__file__).resolve().parent.parent / 'static' / 'css' / 'style.css'
+            self.assertLess(hashed.stat().st_size, original.stat().st_size)
+    
+    def test_missing_manifest_fails_loudly(self):
+        """Teste de erro (sem fallback silencioso) quando falta o collectstatic"""
+        with tempfile.TemporaryDirectory() as static_root:
+            with override_settings(STATIC_ROOT=static_root, STORAGES=MANIFEST_STORAGES):
+                with self.assertRaises(ValueError):
+                    staticfiles_storage.url('css/style.css')
 
 
 class BotResponseLogicTests(TestCase):
@@ -149,3 +229,749 @@ class BotResponseLogicTests(TestCase):
         self.assertEqual(response.status_code, 200)
         response_data = json.loads(response.content)
         self.assertIn('Tchau', response_data['response'])
+
+
+class RuleTableTests(TestCase):
+    """Testes da tabela de regras compilada"""
+    
+    def setUp(self):
+        BotResponse.objects.create(
+            category='greeting',
+            keywords='oi, olá, hello',
+            response_text='Olá! Como posso ajudar você hoje?',
+            priority=2
+        )
+        BotResponse.objects.create(
+            category='help',
+            keywords='ajuda, olá ajuda',
+            response_text='Posso ajudar!',
+            priority=1
+        )
+        BotResponse.objects.create(
+            category='farewell',
+            keywords='tchau',
+            response_text='Inativa',
+            is_active=False
+        )
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tmpdir.cleanup)
+        self.path = Path(self.tmpdir.name) / 'rules.bin'
+    
+    def test_match_follows_priority(self):
+        """Teste de ordem de prioridade e regras inativas"""
+        table = RuleTable(build_rule_table())
+        self.assertEqual(len(table), 2)
+        self.assertEqual(table.match('olá, preciso de ajuda').category, 'help')
+        self.assertEqual(table.match('olá').response_text, 'Olá! Como posso ajudar você hoje?')
+        self.assertIsNone(table.match('tchau'))
+    
+    def test_match_keyword_lengths(self):
+        """Teste de palavras curtas, prefixos comuns e mais de 64 tamanhos distintos"""
+        BotResponse.objects.bulk_create(
+            BotResponse(
+                category='other', keywords=f"prefixo{'x' * i}", response_text=f'Tamanho {i}', priority=100 - i
+            )
+            for i in range(80)
+        )
+        BotResponse.objects.create(category='other', keywords='ok', response_text='Curta', priority=200)
+        table = RuleTable(build_rule_table())
+        
+        self.assertEqual(table.match('ok').response_text, 'Curta')
+        self.assertEqual(table.match('prefixo').response_text, 'Tamanho 0')
+        self.assertEqual(table.match('prefixo' + 'x' * 70).response_text, 'Tamanho 70')
+        self.assertEqual(table.match('um prefixo' + 'x' * 79 + '!').response_text, 'Tamanho 79')
+        self.assertIsNone(table.match('prefix'))
+    
+    def test_published_table_is_used_and_hot_swapped(self):
+        """Teste de publicação, uso pela API e troca de versão"""
+        with override_settings(CHAT_RULES_FILE=str(self.path), CHAT_RULES_CHECK_INTERVAL=0):
+            publish_rule_table()
+            first = rule_tables.get()
+            self.assertEqual(first.match('hello').category, 'greeting')
+            
+            # Alteração direta no banco só aparece após publicar nova versão
+            BotResponse.objects.filter(category='greeting').update(response_text='Oi de novo!')
+            self.assertIs(rule_tables.get(), first)
+            
+            publish_rule_table()
+            second = rule_tables.get()
+            self.assertIsNot(second, first)
+            self.assertGreater(second.version, first.version)
+            
+            response = self.client.post(
+                '/api/chat/',
+                data=json.dumps({'message': 'hello'}),
+                content_type='application/json'
+            )
+            self.assertEqual(json.loads(response.content)['response'], 'Oi de novo!')
+    
+    def test_invalid_table_keeps_previous(self):
+        """Teste de arquivo inválido publicado: o worker mantém a tabela anterior"""
+        with override_settings(CHAT_RULES_FILE=str(self.path), CHAT_RULES_CHECK_INTERVAL=0):
+            first = publish_rule_table()
+            self.assertEqual(rule_tables.get(force=True).version, first.version)
+            
+            broken = self.path.with_name('broken.bin')
+            broken.write_bytes(b'XXXX' + bytes(64))
+            os.replace(broken, self.path)
+            with self.assertLogs('chat.rules', 'ERROR') as logs:
+                self.assertEqual(rule_tables.get().version, first.version)
+            self.assertEqual(len(logs.records), 1)
+            
+            # O mesmo arquivo não é lido de novo a cada requisição
+            with self.assertNoLogs('chat.rules', 'ERROR'):
+                response = self.client.post(
+                    '/api/chat/',
+                    data=json.dumps({'message': 'hello'}),
+                    content_type='application/json'
+                )
+            self.assertEqual(response.status_code, 200)
+    
+    def test_single_publish_per_transaction(self):
+        """Teste de uma única publicação para várias alterações na mesma transação"""
+        with override_settings(CHAT_RULES_FILE=str(self.path), CHAT_RULES_CHECK_INTERVAL=0):
+            first = publish_rule_table()
+            rule_tables.get(force=True)
+            
+            with self.captureOnCommitCallbacks() as callbacks:
+                for rule in BotResponse.objects.filter(is_active=True):
+                    rule.delete()
+            self.assertEqual(len(callbacks), 1)
+            
+            # Falha ao publicar fica no log e não chega à requisição
+            with mock.patch('chat.rules.publish_rule_table', side_effect=PermissionError):
+                with self.assertLogs('chat.rules', 'ERROR'):
+                    callbacks[0]()
+            self.assertEqual(rule_tables.get().version, first.version)
+            
+            callbacks[0]()
+            self.assertEqual(len(rule_tables.get()), 0)
+    
+    def test_compile_rules_command(self):
+        """Teste do comando compile_rules"""
+        call_command('compile_rules', output=str(self.path), stdout=io.StringIO())
+        with override_settings(CHAT_RULES_FILE=str(self.path)):
+            table = rule_tables.get(force=True)
+        self.assertEqual(len(table), 2)
+
+
+class RuleImportExportTests(TestCase):
+    """Testes de importação e exportação das regras"""
+    
+    def setUp(self):
+        self.existing = BotResponse.objects.create(
+            category='greeting',
+            keywords='oi',
+            response_text='Oi!',
+            priority=1
+        )
+    
+    def test_import_jsonl_upserts(self):
+        """Teste de inserção e atualização em lotes"""
+        lines = [
+            {'id': self.existing.pk, 'category': 'greeting', 'keywords': 'oi, olá',
+             'response_text': 'Olá de novo!', 'priority': 3},
+            {'category': 'farewell', 'keywords': 'Tchau, , bye', 'response_text': 'Até logo!'},
+            {'category': 'help', 'keywords': 'ajuda', 'response_text': 'Posso ajudar!',
+             'is_active': False},
+        ]
+        stream = io.StringIO('\n'.join(json.dumps(line) for line in lines) + '\n')
+        
+        created, updated = import_rules(stream, 'jsonl', batch_size=2)
+        
+        self.assertEqual((created, updated), (2, 1))
+        self.existing.refresh_from_db()
+        self.assertEqual(self.existing.response_text, 'Olá de novo!')
+        self.assertEqual(self.existing.priority, 3)
+        farewell = BotResponse.objects.get(category='farewell')
+        self.assertEqual(farewell.keywords, 'tchau, bye')
+        self.assertFalse(BotResponse.objects.get(category='help').is_active)
+    
+    def test_invalid_record_rolls_back(self):
+        """Teste de validação: nada é gravado se um registro for inválido"""
+        stream = io.StringIO(
+            '{"category": "farewell", "keywords": "tchau", "response_text": "Tchau!"}\n'
+            '{"category": "farewell", "keywords": " , ", "response_text": "Tchau!"}\n'
+        )
+        with self.assertRaises(RuleImportError) as ctx:
+            import_rules(stream, 'jsonl')
+        self.assertEqual(ctx.exception.line, 2)
+        self.assertEqual(BotResponse.objects.count(), 1)
+    
+    def test_invalid_values_rejected_with_line(self):
+        """Teste de tipos inválidos e ids repetidos, sempre com o número da linha"""
+        valid = {'category': 'farewell', 'keywords': 'tchau', 'response_text': 'Tchau!'}
+        cases = [
+            {'category': 5},
+            {'keywords': ['tchau']},
+            {'response_text': {'texto': 'Tchau!'}},
+            {'id': 1000},
+        ]
+        for case in cases:
+            for batch_size in (1, 1000):
+                with self.subTest(case=case, batch_size=batch_size):
+                    lines = [{**valid, 'id': 1000}, {**valid, **case}]
+                    stream = io.StringIO('\n'.join(json.dumps(line) for line in lines) + '\n')
+                    with self.assertRaises(RuleImportError) as ctx:
+                        import_rules(stream, 'jsonl', batch_size=batch_size)
+                    self.assertEqual(ctx.exception.line, 2)
+                    self.assertEqual(BotResponse.objects.count(), 1)
+    
+    def test_priority_zero_and_non_utf8_file(self):
+        """Teste de prioridade 0 preservada e de arquivo fora de UTF-8 no comando"""
+        stream = io.StringIO(json.dumps({
+            'category': 'farewell', 'keywords': 'tchau', 'response_text': 'Tchau!', 'priority': 0
+        }) + '\n')
+        import_rules(stream, 'jsonl')
+        self.assertEqual(BotResponse.objects.get(category='farewell').priority, 0)
+        
+        with tempfile.TemporaryDirectory() as tmpdir:
+            path = Path(tmpdir) / 'regras.jsonl'
+            path.write_bytes('{"category": "help", "keywords": "ajuda", "response_text": "Olá"}\n'.encode('latin-1'))
+            with self.assertRaises(CommandError):
+                call_command('import_rules', str(path), stdout=io.StringIO())
+    
+    def test_csv_round_trip_publishes_once(self):
+        """Teste de exportação/importação CSV com uma única publicação"""
+        output = io.StringIO()
+        self.assertEqual(export_rules(output, 'csv'), 1)
+        
+        with tempfile.TemporaryDirectory() as tmpdir:
+            path = Path(tmpdir) / 'rules.bin'
+            with override_settings(CHAT_RULES_FILE=str(path)):
+                publish_rule_table()
+                with self.captureOnCommitCallbacks(execute=True) as callbacks:
+                    output.seek(0)
+                    created, updated = import_rules(output, 'csv', batch_size=1)
+                
+                self.assertEqual((created, updated), (0, 1))
+                self.assertEqual(len(callbacks), 1)
+                self.assertEqual(len(rule_tables.get(force=True)), 1)
+
+
+# Orçamentos de latência (ms) por endpoint. Dependem da máquina, então só
+# são verificados com CHAT_PERF_BUDGETS=1; os de queries valem sempre.
+LATENCY_BUDGETS = {
+    'index': 50,
+    'chat_api': 250,
+    'chat_api_compiled': 50,
+    'chat_history': 100,
+    'clear_chat': 50,
+    'admin_changelist': 500,
+}
+
+
+@override_settings(CHAT_RESPONSE_DELAY=0)
+class PerformanceBudgetTests(TestCase):
+    """Orçamentos de queries e latência com volume grande de dados"""
+    
+    RULES = 10_000
+    MESSAGES = 100_000
+    SESSIONS = 100
+    
+    @classmethod
+    def setUpTestData(cls):
+        cls.admin = User.objects.create_superuser('admin', 'admin@example.com', 'adminpass123')
+        BotResponse.objects.bulk_create(
+            BotResponse(
+                category='other',
+                keywords=f'regra{i}a, regra{i}b, regra{i}c',
+                response_text=f'Resposta {i}',
+                priority=i % 10
+            )
+            for i in range(cls.RULES)
+        )
+        ChatSession.objects.bulk_create(
+            ChatSession(session_id=f'sessao-{i}', user=cls.admin) for i in range(cls.SESSIONS)
+        )
+        start = timezone.now() - timedelta(days=1)
+        ChatMessage.objects.bulk_create(
+            (
+                ChatMessage(
+                    user=cls.admin,
+                    user_message=f'Mensagem {i}',
+                    bot_response=f'Resposta {i}',
+                    session_id=f'sessao-{i % cls.SESSIONS}',
+                    created_at=start + timedelta(milliseconds=i)
+                )
+                for i in range(cls.MESSAGES)
+            ),
+            batch_size=5000
+        )
+    
+    def setUp(self):
+        # Resolução do cliente sempre a frio, para contagens determinísticas
+        clear_tenant_cache()
+    
+    def assertWithinBudget(self, name, func):
+        """Executar `func` e verificar o orçamento de latência, se ativo"""
+        start = time.perf_counter()
+        result = func()
+        elapsed_ms = (time.perf_counter() - start) * 1000
+        if os.environ.get('CHAT_PERF_BUDGETS') == '1':
+            self.assertLess(
+                elapsed_ms, LATENCY_BUDGETS[name],
+                f'{name} levou {elapsed_ms:.1f} ms (orçamento {LATENCY_BUDGETS[name]} ms)'
+            )
+        return result
+    
+    def use_session(self, session_id):
+        session = self.client.session
+        session['chat_session_id'] = session_id
+        session.save()
+    
+    def post_message(self, message):
+        return self.client.post(
+            reverse('chat:chat_api'),
+            data=json.dumps({'message': message, 'session_id': 'sessao-0'}),
+            content_type='application/json'
+        )
+    
+    def test_index(self):
+        with self.assertNumQueries(0):
+            response = self.assertWithinBudget('index', lambda: self.client.get(reverse('chat:index')))
+        self.assertEqual(response.status_code, 200)
+    
+    def test_chat_api_database_rules(self):
+        # Cliente do host, dono da sessão, leitura das regras e gravação da
+        # mensagem, independente do volume
+        with self.assertNumQueries(4):
+            response = self.assertWithinBudget('chat_api', lambda: self.post_message('nada casa aqui'))
+        self.assertEqual(response.status_code, 200)
+    
+    def test_chat_api_compiled_rules(self):
+        with tempfile.TemporaryDirectory() as tmpdir:
+            path = str(Path(tmpdir) / 'rules.bin')
+            with override_settings(CHAT_RULES_FILE=path):
+                publish_rule_table()
+                rule_tables.get(force=True)
+                with self.assertNumQueries(3):
+                    response = self.assertWithinBudget(
+                        'chat_api_compiled', lambda: self.post_message('quero a regra9999c')
+                    )
+        self.assertEqual(json.loads(response.content)['response'], 'Resposta 9999')
+    
+    def test_chat_history_is_bounded(self):
+        self.use_session('sessao-1')
+        # Sessão, cliente do host, última mensagem (ETag) e a página de histórico
+        with self.assertNumQueries(4):
+            response = self.assertWithinBudget(
+                'chat_history', lambda: self.client.get(reverse('chat:chat_history'))
+            )
+        messages = json.loads(response.content)['messages']
+        self.assertEqual(len(messages), min(self.MESSAGES // self.SESSIONS, 100))
+        self.assertEqual(messages[-1]['user_message'], f'Mensagem {self.MESSAGES - self.SESSIONS + 1}')
+        
+        with self.assertNumQueries(2):
+            cached = self.client.get(
+                reverse('chat:chat_history'), HTTP_IF_NONE_MATCH=response.headers['ETag']
+            )
+        self.assertEqual(cached.status_code, 304)
+    
+    def test_clear_chat(self):
+        self.use_session('sessao-2')
+        # Sessão, cliente do host, marcação da sessão do chat (sem tocar nas
+        # mensagens) e gravação da sessão (com savepoint)
+        with self.assertNumQueries(6):
+            response = self.assertWithinBudget(
+                'clear_chat', lambda: self.client.post(reverse('chat:clear_chat'))
+            )
+        self.assertEqual(response.status_code, 200)
+    
+    def test_rule_index_stats(self):
+        self.client.force_login(self.admin)
+        with self.assertNumQueries(2):
+            response = self.client.get(reverse('chat:rule_index_stats'))
+        self.assertEqual(response.status_code, 200)
+    
+    def test_admin_changelists(self):
+        self.client.force_login(self.admin)
+        # Sessão/usuário, contagens do paginador, opções de filtro e uma página
+        # de resultados, sem queries por linha
+        budgets = {
+            'admin:chat_chatmessage_changelist': 6,
+            'admin:chat_chatsession_changelist': 5,
+            'admin:chat_botresponse_changelist': 7,
+        }
+        for url_name, queries in budgets.items():
+            with self.subTest(url_name), self.assertNumQueries(queries):
+                response = self.assertWithinBudget(
+                    'admin_changelist', lambda: self.client.get(reverse(url_name))
+                )
+                self.assertEqual(response.status_code, 200)
+
+
+class DynamicResponseTests(TestCase):
+    """Testes das respostas dinâmicas de horário e clima"""
+    
+    def setUp(self):
+        provider_cache.clear()
+        self.addCleanup(provider_cache.clear)
+    
+    def test_time_response(self):
+        """Teste de placeholders preenchidos pelo relógio"""
+        BotResponse.objects.create(
+            category='time',
+            keywords='que horas',
+            response_text='Agora são {hora} do dia {data}.',
+        )
+        response = self.client.post(
+            '/api/chat/',
+            data=json.dumps({'message': 'Que horas são?'}),
+            content_type='application/json'
+        )
+        text = json.loads(response.content)['response']
+        self.assertIn(timezone.localtime().strftime('%d/%m/%Y'), text)
+        self.assertNotIn('{hora}', text)
+    
+    def test_weather_file_provider(self):
+        """Teste do provedor de clima em arquivo e de placeholders desconhecidos"""
+        with tempfile.TemporaryDirectory() as tmpdir:
+            path = Path(tmpdir) / 'weather.json'
+            path.write_text(json.dumps({'cidade': 'Recife', 'temperatura': 31}))
+            providers = {'weather': 'chat.providers.WeatherFileProvider'}
+            with override_settings(CHAT_RESPONSE_PROVIDERS=providers, CHAT_WEATHER_FILE=path):
+                text = render_response('weather', '{cidade}: {temperatura}°C, {condicao}')
+        self.assertEqual(text, 'Recife: 31°C, {condicao}')
+        self.assertEqual(render_response('other', 'Sem {placeholders}'), 'Sem {placeholders}')
+    
+    def test_cache_single_flight(self):
+        """Teste de cálculo único para requisições concorrentes"""
+        cache = TTLCache()
+        calls = []
+        
+        def compute():
+            calls.append(1)
+            time.sleep(0.05)
+            return {'hora': '12:00'}
+        
+        results = []
+        threads = [
+            threading.Thread(target=lambda: results.append(cache.get_or_compute('time', 60, compute)))
+            for _ in range(8)
+        ]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        
+        self.assertEqual(len(calls), 1)
+        self.assertEqual(results, [{'hora': '12:00'}] * 8)
+        
+        cache.get_or_compute('time', 60, compute)
+        self.assertEqual(len(calls), 1)
+        cache.get_or_compute('expira', 0, compute)
+        cache.get_or_compute('expira', 0, compute)
+        self.assertEqual(len(calls), 3)
+    
+    def test_cache_maxsize(self):
+        """Teste de descarte das entradas vencidas e das menos usadas"""
+        cache = TTLCache(maxsize=3)
+        cache.get_or_compute('a', 60, lambda: 1)
+        cache.get_or_compute('vencida', 0, lambda: 2)
+        cache.get_or_compute('b', 60, lambda: 3)
+        cache.get_or_compute('c', 60, lambda: 4)
+        self.assertEqual(list(cache._values), ['a', 'b', 'c'])
+        
+        cache.get_or_compute('a', 60, lambda: 5)
+        cache.get_or_compute('d', 60, lambda: 6)
+        self.assertEqual(list(cache._values), ['c', 'a', 'd'])
+        self.assertEqual(cache.get_or_compute('a', 60, lambda: 7), 1)
+        self.assertEqual(cache.get_or_compute('b', 60, lambda: 8), 8)
+
+
+class CodecTests(TestCase):
+    """Testes do codec JSON e dos limites de requisição"""
+    
+    def post(self, body):
+        return self.client.post('/api/chat/', data=body, content_type='application/json')
+    
+    def test_request_limits(self):
+        """Teste de rejeição de corpos e mensagens grandes e de JSON inválido"""
+        response = self.post(json.dumps({'message': 'a' * 501}))
+        self.assertEqual(response.status_code, 413)
+        
+        response = self.post(json.dumps({'message': 'oi', 'extra': 'x' * 5000}))
+        self.assertEqual(response.status_code, 413)
+        
+        response = self.post('{"message": ')
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(json.loads(response.content)['error'], 'JSON inválido')
+        
+        response = self.post(json.dumps({'message': ['oi']}))
+        self.assertEqual(response.status_code, 400)
+    
+    def test_iter_encode_list(self):
+        """Teste da codificação em partes"""
+        items = [{'n': i, 'texto': 'olá'} for i in range(3)]
+        encoded = b''.join(codec.iter_encode_list('messages', items, extra={'total': 3}))
+        self.assertEqual(json.loads(encoded), {'total': 3, 'messages': items})
+        self.assertEqual(json.loads(b''.join(codec.iter_encode_list('messages', []))), {'messages': []})
+    
+    @override_settings(CHAT_HISTORY_LIMIT=None)
+    def test_large_history_is_streamed(self):
+        """Teste do histórico em streaming"""
+        ChatSession.objects.create(session_id='test-session-123')
+        session = self.client.session
+        session['chat_session_id'] = 'test-session-123'
+        session.save()
+        ChatMessage.objects.bulk_create(
+            ChatMessage(user_message=f'm{i}', bot_response='r', session_id='test-session-123')
+            for i in range(5)
+        )
+        
+        response = self.client.get(reverse('chat:chat_history'))
+        self.assertTrue(response.streaming)
+        messages = json.loads(b''.join(response.streaming_content))['messages']
+        self.assertEqual(len(messages), 5)
+
+
+class TenantTests(TestCase):
+    """Testes de regras por cliente"""
+    
+    def setUp(self):
+        clear_tenant_cache()
+        rule_indexes.clear()
+        self.addCleanup(clear_tenant_cache)
+        self.addCleanup(rule_indexes.clear)
+        
+        self.acme = Tenant.objects.create(name='Acme', slug='acme', domain='acme.example.com')
+        self.globex = Tenant.objects.create(name='Globex', slug='globex')
+        BotResponse.objects.create(category='greeting', keywords='oi', response_text='Oi global!')
+        BotResponse.objects.create(tenant=self.acme, category='greeting', keywords='oi', response_text='Oi da Acme!')
+        BotResponse.objects.create(tenant=self.globex, category='greeting', keywords='oi', response_text='Oi da Globex!')
+    
+    def ask(self, path, message='oi', **extra):
+        response = self.client.post(
+            path, data=json.dumps({'message': message}), content_type='application/json', **extra
+        )
+        return json.loads(response.content)['response']
+    
+    @override_settings(ALLOWED_HOSTS=['testserver', 'acme.example.com'])
+    def test_tenant_resolution(self):
+        """Teste de cliente por host, por prefixo de caminho e regras globais"""
+        self.assertEqual(self.ask('/api/chat/'), 'Oi global!')
+        self.assertEqual(self.ask('/api/chat/', HTTP_HOST='acme.example.com'), 'Oi da Acme!')
+        self.assertEqual(self.ask('/t/globex/api/chat/'), 'Oi da Globex!')
+        self.assertEqual(self.client.get('/t/desconhecido/api/history/').status_code, 404)
+        
+        # Slug desconhecido não fica em cache: o cliente criado em seguida já é encontrado
+        Tenant.objects.create(name='Novo', slug='desconhecido')
+        self.assertEqual(self.client.get('/t/desconhecido/api/history/').status_code, 200)
+        
+        page = self.client.get('/t/globex/')
+        self.assertContains(page, 'data-api-chat="/t/globex/api/chat/"')
+        self.assertEqual(reverse('chat:chat_api'), '/api/chat/')
+    
+    @override_settings(CHAT_RESPONSE_DELAY=0)
+    def test_sessions_are_isolated_per_tenant(self):
+        """Teste de sessões, histórico e limpeza separados por cliente"""
+        def post(path, **data):
+            response = self.client.post(
+                path, data=json.dumps({'message': 'oi', **data}), content_type='application/json'
+            )
+            return response.status_code, json.loads(response.content)
+        
+        def history(prefix):
+            return json.loads(self.client.get(f'{prefix}/api/history/').content)['messages']
+        
+        _, acme = post('/t/acme/api/chat/')
+        _, globex = post('/t/globex/api/chat/')
+        self.assertNotEqual(acme['session_id'], globex['session_id'])
+        self.assertEqual(ChatSession.objects.get(session_id=acme['session_id']).tenant, self.acme)
+        self.assertEqual(self.client.session[f'chat_session_id:{self.acme.pk}'], acme['session_id'])
+        
+        self.assertEqual([m['bot_response'] for m in history('/t/acme')], ['Oi da Acme!'])
+        self.assertEqual([m['bot_response'] for m in history('/t/globex')], ['Oi da Globex!'])
+        self.assertEqual(history(''), [])
+        
+        # Sessão de outro cliente informada no corpo
+        status, data = post('/t/globex/api/chat/', session_id=acme['session_id'])
+        self.assertEqual(status, 403)
+        self.assertEqual(data, {'error': 'Sessão inválida'})
+        self.assertEqual(post('/api/chat/', session_id=acme['session_id'])[0], 403)
+        self.assertEqual(post('/t/acme/api/chat/', session_id=acme['session_id'])[0], 200)
+        
+        # ID gerado pelo navegador (sem sessão no banco) passa a ser do cliente
+        self.assertEqual(post('/t/acme/api/chat/', session_id='uuid-do-navegador')[0], 200)
+        self.assertEqual(ChatSession.objects.get(session_id='uuid-do-navegador').tenant, self.acme)
+        self.assertEqual(post('/t/globex/api/chat/', session_id='uuid-do-navegador')[0], 403)
+        self.assertEqual(post('/api/chat/', session_id='uuid-do-navegador')[0], 403)
+        self.assertEqual(ChatMessage.objects.filter(session_id='uuid-do-navegador').count(), 1)
+        self.assertEqual(post('/t/acme/api/chat/', session_id=5)[0], 403)
+        
+        self.client.post('/t/globex/api/clear/')
+        self.assertEqual(history('/t/globex'), [])
+        self.assertEqual(len(history('/t/acme')), 2)
+        self.assertIsNone(ChatSession.objects.get(session_id=acme['session_id']).cleared_at)
+    
+    def test_index_rebuilt_after_rule_change(self):
+        """Teste de recompilação do índice quando as regras do cliente mudam"""
+        self.assertEqual(self.ask('/t/acme/api/chat/'), 'Oi da Acme!')
+        self.assertEqual(self.ask('/t/acme/api/chat/'), 'Oi da Acme!')
+        self.assertEqual(rule_indexes.stats()['hits'], 1)
+        
+        rule = BotResponse.objects.get(tenant=self.acme)
+        rule.response_text = 'Olá, Acme aqui!'
+        rule.save()
+        clear_tenant_cache()
+        
+        self.assertEqual(self.ask('/t/acme/api/chat/'), 'Olá, Acme aqui!')
+        self.assertEqual(rule_indexes.stats()['misses'], 2)
+    
+    @override_settings(CHAT_RESPONSE_DELAY=0)
+    def test_tenant_inherits_global_rules(self):
+        """Teste de regras globais para o cliente sem copiá-las para o índice dele"""
+        farewell = BotResponse.objects.create(
+            category='farewell', keywords='tchau', response_text='Tchau global!', priority=2
+        )
+        BotResponse.objects.create(
+            tenant=self.acme, category='farewell', keywords='tchau', response_text='Tchau da Acme!', priority=3
+        )
+        self.acme.refresh_from_db()
+        clear_tenant_cache()
+        
+        # A global de maior prioridade vence; na mesma prioridade, a do cliente
+        self.assertEqual(self.ask('/t/acme/api/chat/', 'tchau'), 'Tchau global!')
+        self.assertEqual(self.ask('/t/acme/api/chat/', 'oi'), 'Oi da Acme!')
+        self.assertEqual(len(rule_indexes.get(self.acme)), 2)
+        
+        # Mudança nas regras globais não recompila os índices dos clientes
+        versions = list(Tenant.objects.values_list('rules_version', flat=True))
+        farewell.response_text = 'Até mais!'
+        farewell.save()
+        self.assertEqual(list(Tenant.objects.values_list('rules_version', flat=True)), versions)
+        self.assertEqual(self.ask('/t/acme/api/chat/', 'tchau'), 'Até mais!')
+        self.assertEqual(self.ask('/t/globex/api/chat/', 'tchau'), 'Até mais!')
+        
+        # Com a tabela compilada, as globais vêm dela
+        with tempfile.TemporaryDirectory() as tmpdir:
+            with override_settings(CHAT_RULES_FILE=str(Path(tmpdir) / 'rules.bin')):
+                publish_rule_table()
+                rule_tables.get(force=True)
+                self.assertEqual(self.ask('/t/acme/api/chat/', 'tchau'), 'Até mais!')
+                self.assertEqual(self.ask('/t/globex/api/chat/', 'oi'), 'Oi da Globex!')
+                self.assertEqual(self.ask('/api/chat/', 'oi'), 'Oi global!')
+        self.assertEqual(rule_indexes.stats()['misses'], 2)
+    
+    def test_rule_moved_between_tenants(self):
+        """Teste de nova versão para os dois clientes quando a regra muda de cliente"""
+        def versions():
+            return list(Tenant.objects.order_by('pk').values_list('rules_version', flat=True))
+        
+        rule = BotResponse.objects.get(tenant=self.acme)
+        acme_version, globex_version = versions()
+        rule.tenant = self.globex
+        rule.save()
+        self.assertEqual(versions(), [acme_version + 1, globex_version + 1])
+        
+        # Instância que não veio do banco
+        BotResponse(
+            pk=rule.pk, tenant=self.acme, category='greeting', keywords='oi', response_text='Oi da Acme!'
+        ).save()
+        self.assertEqual(versions(), [acme_version + 2, globex_version + 2])
+    
+    def test_import_rejects_rules_of_other_tenant(self):
+        """Teste de importação com id de regra de outro cliente"""
+        globex_rule = BotResponse.objects.get(tenant=self.globex)
+        record = {'id': globex_rule.pk, 'category': 'greeting', 'keywords': 'oi', 'response_text': 'Oi!'}
+        
+        for tenant in [self.acme, None]:
+            with self.subTest(tenant=tenant), self.assertRaises(RuleImportError) as ctx:
+                import_rules(io.StringIO(json.dumps(record) + '\n'), 'jsonl', tenant=tenant)
+            self.assertEqual(ctx.exception.line, 1)
+        
+        globex_rule.refresh_from_db()
+        self.assertEqual(globex_rule.tenant, self.globex)
+        self.assertEqual(globex_rule.response_text, 'Oi da Globex!')
+        
+        record['response_text'] = 'Olá da Globex!'
+        self.assertEqual(
+            import_rules(io.StringIO(json.dumps(record) + '\n'), 'jsonl', tenant=self.globex), (0, 1)
+        )
+    
+    def test_export_rules_command_per_tenant(self):
+        """Teste de export_rules: só regras globais sem --tenant, e cliente desconhecido"""
+        with tempfile.TemporaryDirectory() as tmpdir:
+            path = os.path.join(tmpdir, 'regras.jsonl')
+            for tenant, text in [(None, 'Oi global!'), ('acme', 'Oi da Acme!')]:
+                with self.subTest(tenant=tenant):
+                    call_command('export_rules', path, tenant=tenant, stdout=io.StringIO())
+                    with open(path, encoding='utf-8') as stream:
+                        records = [json.loads(line) for line in stream]
+                    self.assertEqual([r['response_text'] for r in records], [text])
+            
+            with self.assertRaises(CommandError):
+                call_command('export_rules', path, tenant='desconhecido', stdout=io.StringIO())
+    
+    def test_lru_eviction_under_budget(self):
+        """Teste de descarte do índice menos usado ao passar do orçamento"""
+        acme_index = rule_indexes.get(self.acme)
+        with override_settings(CHAT_RULE_INDEX_BUDGET=acme_index.size + 10):
+            rule_indexes.get(self.globex)
+            stats = rule_indexes.stats()
+            self.assertEqual(stats['indexes'], 1)
+            self.assertEqual(stats['evictions'], 1)
+            self.assertLessEqual(stats['bytes'], stats['budget_bytes'])
+            self.assertIsNot(rule_indexes.get(self.acme), acme_index)
+
+
+class ClearChatTests(TestCase):
+    """Testes da limpeza do chat e da remoção em segundo plano"""
+    
+    def setUp(self):
+        ChatSession.objects.create(session_id='limpar')
+        ChatSession.objects.create(session_id='manter')
+        ChatMessage.objects.bulk_create(
+            ChatMessage(user_message=f'm{i}', bot_response='r', session_id=session_id)
+            for session_id in ['limpar', 'manter']
+            for i in range(7)
+        )
+        session = self.client.session
+        session['chat_session_id'] = 'limpar'
+        session.save()
+    
+    def test_clear_hides_messages_until_purged(self):
+        """Teste de limpeza sem apagar e de remoção em lotes"""
+        response = self.client.post(reverse('chat:clear_chat'))
+        self.assertEqual(response.status_code, 200)
+        self.assertNotIn('chat_session_id', self.client.session)
+        
+        cleared = ChatSession.objects.get(session_id='limpar')
+        self.assertFalse(cleared.is_active)
+        self.assertIsNotNone(cleared.cleared_at)
+        self.assertEqual(ChatMessage.objects.filter(session_id='limpar').count(), 7)
+        self.assertFalse(ChatMessage.objects.visible().filter(session_id='limpar').exists())
+        
+        # Mensagens novas na mesma sessão continuam visíveis
+        ChatMessage.objects.create(user_message='nova', bot_response='r', session_id='limpar')
+        self.assertEqual(ChatMessage.objects.visible().filter(session_id='limpar').count(), 1)
+        
+        self.assertEqual(purge_cleared_messages(batch_size=3, pause=0), 7)
+        self.assertEqual(ChatMessage.objects.filter(session_id='limpar').count(), 1)
+        self.assertEqual(ChatMessage.objects.filter(session_id='manter').count(), 7)
+        self.assertIsNone(ChatSession.objects.get(session_id='limpar').cleared_at)
+        self.assertEqual(ChatMessage.objects.visible().filter(session_id='limpar').count(), 1)
+        self.assertEqual(purge_cleared_messages(batch_size=3, pause=0), 0)
+    
+    def test_purge_keeps_session_cleared_again(self):
+        """Teste de sessão limpa de novo durante a remoção (continua marcada)"""
+        self.client.post(reverse('chat:clear_chat'))
+        later = timezone.now() + timedelta(seconds=1)
+        
+        def clear_again(seconds):
+            ChatSession.objects.filter(session_id='limpar').update(cleared_at=later)
+        
+        with mock.patch('chat.reaper.time.sleep', side_effect=clear_again):
+            self.assertEqual(purge_cleared_messages(batch_size=3, pause=0.01), 7)
+        self.assertEqual(ChatSession.objects.get(session_id='limpar').cleared_at, later)
+        
+        self.assertEqual(purge_cleared_messages(batch_size=3, pause=0), 0)
+        self.assertIsNone(ChatSession.objects.get(session_id='limpar').cleared_at)
+    
+    def test_purge_command(self):
+        """Teste do comando purge_cleared_chats"""
+        self.client.post(reverse('chat:clear_chat'))
+        output = io.StringIO()
+        call_command('purge_cleared_chats', batch_size=2, pause=0, stdout=output)
+        self.assertIn('7 mensagens removidas', output.getvalue())
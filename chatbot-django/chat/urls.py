@@ -11,4 +11,5 @@ urlpatterns = [
     path('api/chat/', views.ChatAPIView.as_view(), name='chat_api'),
     path('api/clear/', views.ClearChatView.as_view(), name='clear_chat'),
     path('api/history/', views.ChatHistoryView.as_view(), name='chat_history'),
+    path('api/rules/stats/', views.RuleIndexStatsView.as_view(), name='rule_index_stats'),
 ]
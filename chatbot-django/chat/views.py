@@ -1,14 +1,38 @@
+from django.conf import settings
+from django.contrib.admin.views.decorators import staff_member_required
 from django.shortcuts import render
-from django.http import JsonResponse
+from django.http import HttpResponse, StreamingHttpResponse
+from django.utils import timezone
+from django.utils.cache import get_conditional_response, patch_cache_control
+from django.utils.http import http_date, quote_etag
 from django.views.decorators.csrf import csrf_exempt
 from django.views.decorators.http import require_http_methods
 from django.utils.decorators import method_decorator
 from django.views import View
-import json
 import random
 import time
 import uuid
-from .models import ChatMessage, ChatSession, BotResponse
+from . import codec
+from .models import ChatMessage, ChatSession
+from .providers import render_response
+from .rules import match_rules, rule_indexes
+from .tenants import get_request_tenant
+
+
+# Acima deste limite de mensagens o histórico é enviado em streaming
+HISTORY_STREAM_THRESHOLD = 500
+
+
+def json_response(data, status=200):
+    """Resposta JSON codificada pelo codec do chat (orjson quando disponível)"""
+    return HttpResponse(codec.dumps(data), status=status, content_type='application/json')
+
+
+def session_key(tenant):
+    """Chave da sessão do chat na sessão do Django, uma por cliente"""
+    if tenant is None:
+        return 'chat_session_id'
+    return f'chat_session_id:{tenant.pk}'
 
 
 class ChatBotView(View):
@@ -29,62 +53,91 @@ class ChatAPIView(View):
     def post(self, request):
         """Processar mensagem do usuário e retornar resposta do bot"""
         try:
-            data = json.loads(request.body)
-            user_message = data.get('message', '').strip()
-            session_id = data.get('session_id') or self._get_or_create_session_id(request)
-            
+            # Limites verificados antes de ler e decodificar o corpo
+            codec.check_content_length(request.META.get('CONTENT_LENGTH'), settings.CHAT_MAX_BODY_SIZE)
+            data = codec.decode_chat_request(
+                request.body, settings.CHAT_MAX_BODY_SIZE, settings.CHAT_MAX_MESSAGE_LENGTH
+            )
+            user_message = data['message']
             if not user_message:
-                return JsonResponse({'error': 'Mensagem vazia'}, status=400)
+                return json_response({'error': 'Mensagem vazia'}, status=400)
+            
+            tenant = get_request_tenant(request)
+            session_id = data.get('session_id')
+            if session_id:
+                if not self._claim_session(request, session_id, tenant):
+                    return json_response({'error': 'Sessão inválida'}, status=403)
+            else:
+                session_id = self._get_or_create_session_id(request, tenant)
             
             # Simular delay para parecer mais realista
-            time.sleep(0.5)
+            if settings.CHAT_RESPONSE_DELAY:
+                time.sleep(settings.CHAT_RESPONSE_DELAY)
             
             # Obter resposta do bot
-            bot_response = self._get_bot_response(user_message)
+            bot_response = self._get_bot_response(user_message, tenant)
             
             # Salvar no banco de dados
             self._save_chat_message(user_message, bot_response, session_id, request.user)
             
-            return JsonResponse({
+            return json_response({
                 'response': bot_response,
                 'session_id': session_id,
                 'timestamp': time.time()
             })
             
-        except json.JSONDecodeError:
-            return JsonResponse({'error': 'JSON inválido'}, status=400)
+        except codec.CodecError as e:
+            return json_response({'error': e.message}, status=e.status)
         except Exception as e:
-            return JsonResponse({'error': 'Erro interno do servidor'}, status=500)
+            return json_response({'error': 'Erro interno do servidor'}, status=500)
     
-    def _get_or_create_session_id(self, request):
-        """Obter ou criar ID da sessão"""
-        session_id = request.session.get('chat_session_id')
+    def _get_or_create_session_id(self, request, tenant=None):
+        """Obter ou criar ID da sessão do cliente"""
+        session_id = request.session.get(session_key(tenant))
         if not session_id:
             session_id = str(uuid.uuid4())
-            request.session['chat_session_id'] = session_id
+            request.session[session_key(tenant)] = session_id
             
             # Criar sessão no banco
             ChatSession.objects.create(
                 session_id=session_id,
-                user=request.user if request.user.is_authenticated else None
+                user=request.user if request.user.is_authenticated else None,
+                tenant=tenant
             )
         
         return session_id
     
-    def _get_bot_response(self, message):
+    def _claim_session(self, request, session_id, tenant=None):
+        """
+        Registrar o ID de sessão enviado pelo navegador para o cliente
+
+        Um ID novo passa a pertencer ao cliente da requisição; retorna False
+        se o ID for inválido ou já pertencer a outro cliente.
+        """
+        max_length = ChatSession._meta.get_field('session_id').max_length
+        if not isinstance(session_id, str) or len(session_id) > max_length:
+            return False
+        
+        session, _ = ChatSession.objects.get_or_create(
+            session_id=session_id,
+            defaults={
+                'user': request.user if request.user.is_authenticated else None,
+                'tenant': tenant,
+            }
+        )
+        return session.tenant_id == (tenant.pk if tenant else None)
+    
+    def _get_bot_response(self, message, tenant=None):
         """
         Gerar resposta do bot baseada na mensagem do usuário
         """
         message_lower = message.lower().strip()
         
-        # Buscar respostas do banco de dados
-        bot_responses = BotResponse.objects.filter(is_active=True).order_by('priority')
-        
-        # Procurar por correspondências de palavras-chave
-        for bot_response in bot_responses:
-            keywords = bot_response.get_keywords_list()
-            if any(keyword in message_lower for keyword in keywords):
-                return bot_response.response_text
+        # Regras do cliente (índice próprio) e globais (tabela publicada com
+        # manage.py compile_rules ou, sem ela, o banco de dados)
+        rule = match_rules(message_lower, tenant)
+        if rule is not None:
+            return render_response(rule.category, rule.response_text)
         
         # Se não encontrar correspondência, usar respostas padrão hardcoded
         return self._get_default_response(message_lower)
@@ -165,22 +218,24 @@ class ClearChatView(View):
     def post(self, request):
         """Limpar histórico do chat da sessão atual"""
         try:
-            session_id = request.session.get('chat_session_id')
+            tenant = get_request_tenant(request)
+            key = session_key(tenant)
+            session_id = request.session.get(key)
             if session_id:
-                # Marcar mensagens como inativas ao invés de deletar
-                ChatMessage.objects.filter(session_id=session_id).delete()
-                
-                # Atualizar sessão
-                ChatSession.objects.filter(session_id=session_id).update(is_active=False)
+                # Marcar a sessão como limpa: um único UPDATE oculta as
+                # mensagens, que são removidas depois em lotes pequenos
+                # (manage.py purge_cleared_chats)
+                ChatSession.objects.filter(session_id=session_id, tenant=tenant).update(
+                    is_active=False, cleared_at=timezone.now()
+                )
                 
                 # Remover da sessão
-                if 'chat_session_id' in request.session:
-                    del request.session['chat_session_id']
+                del request.session[key]
             
-            return JsonResponse({'message': 'Chat limpo com sucesso'})
+            return json_response({'message': 'Chat limpo com sucesso'})
             
         except Exception as e:
-            return JsonResponse({'error': 'Erro ao limpar chat'}, status=500)
+            return json_response({'error': 'Erro ao limpar chat'}, status=500)
 
 
 class ChatHistoryView(View):
@@ -190,18 +245,77 @@ class ChatHistoryView(View):
     
     def get(self, request):
         """Obter histórico de mensagens da sessão atual"""
-        session_id = request.session.get('chat_session_id')
+        tenant = get_request_tenant(request)
+        session_id = request.session.get(session_key(tenant))
         if not session_id:
-            return JsonResponse({'messages': []})
+            return json_response({'messages': []})
         
-        messages = ChatMessage.objects.filter(session_id=session_id).order_by('created_at')
+        # Só mensagens de uma sessão do próprio cliente (subquery, sem
+        # consulta extra)
+        sessions = ChatSession.objects.filter(session_id=session_id, tenant=tenant)
+        messages = ChatMessage.objects.visible().filter(
+            session_id__in=sessions.values('session_id')
+        )
         
-        history = []
-        for message in messages:
-            history.append({
-                'user_message': message.user_message,
-                'bot_response': message.bot_response,
-                'timestamp': message.created_at.isoformat()
-            })
+        # ETag/Last-Modified derivados da última mensagem da sessão: se nada
+        # mudou desde a última visita o navegador recebe 304 sem corpo
+        latest = messages.order_by('-created_at', '-pk').values('pk', 'created_at').first()
+        if latest:
+            etag = quote_etag(f"{session_id}:{latest['pk']}")
+            last_modified = int(latest['created_at'].timestamp())
+            response = get_conditional_response(request, etag=etag, last_modified=last_modified)
+            if response is None:
+                response = self._history_response(messages)
+            response.headers['ETag'] = etag
+            response.headers['Last-Modified'] = http_date(last_modified)
+        else:
+            response = json_response({'messages': []})
+        
+        patch_cache_control(response, private=True, no_cache=True)
+        return response
+    
+    def _history_response(self, messages):
+        """Montar a resposta com as últimas CHAT_HISTORY_LIMIT mensagens"""
+        limit = settings.CHAT_HISTORY_LIMIT
+        if limit is None or limit > HISTORY_STREAM_THRESHOLD:
+            return self._streaming_history_response(messages, limit)
+        
+        latest = messages.order_by('-created_at', '-pk').only(
+            'user_message', 'bot_response', 'created_at'
+        )[:limit]
+        
+        history = [self._serialize(message) for message in reversed(list(latest))]
+        return json_response({'messages': history})
+    
+    def _streaming_history_response(self, messages, limit):
+        """Enviar históricos grandes em partes, lendo o banco aos poucos"""
+        if limit is not None:
+            cutoff = messages.order_by('-created_at', '-pk').values_list(
+                'created_at', flat=True
+            )[limit - 1:limit].first()
+            if cutoff is not None:
+                messages = messages.filter(created_at__gte=cutoff)
         
-        return JsonResponse({'messages': history})
+        rows = messages.order_by('created_at', 'pk').only(
+            'user_message', 'bot_response', 'created_at'
+        ).iterator(chunk_size=500)
+        chunks = codec.iter_encode_list('messages', (self._serialize(message) for message in rows))
+        return StreamingHttpResponse(chunks, content_type='application/json')
+    
+    @staticmethod
+    def _serialize(message):
+        return {
+            'user_message': message.user_message,
+            'bot_response': message.bot_response,
+            'timestamp': message.created_at.isoformat()
+        }
+
+
+@method_decorator(staff_member_required, name='dispatch')
+class RuleIndexStatsView(View):
+    """
+    Métricas do cache de índices de regras por cliente deste worker
+    """
+    
+    def get(self, request):
+        return json_response(rule_indexes.stats())
@@ -10,6 +10,7 @@ For the full list of settings and their values, see
 https://docs.djangoproject.com/en/5.2/ref/settings/
 """
 
+import os
 from pathlib import Path
 
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
@@ -42,6 +43,8 @@ INSTALLED_APPS = [
 
 MIDDLEWARE = [
     'django.middleware.security.SecurityMiddleware',
+    'whitenoise.middleware.WhiteNoiseMiddleware',
+    'chat.tenants.TenantMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
@@ -120,6 +123,21 @@ STATIC_URL = 'static/'
 STATICFILES_DIRS = [
     BASE_DIR / 'static',
 ]
+STATIC_ROOT = BASE_DIR / 'staticfiles'
+
+# collectstatic minifica CSS/JS, adiciona o hash do conteúdo ao nome e gera
+# versões .gz/.br; o WhiteNoise serve os arquivos com hash com cache "immutable"
+STORAGES = {
+    'default': {
+        'BACKEND': 'django.core.files.storage.FileSystemStorage',
+    },
+    'staticfiles': {
+        'BACKEND': 'chatbot_project.storage.MinifiedManifestStaticFilesStorage',
+    },
+}
+
+# Nos testes os estáticos usam o storage simples (sem manifest)
+TEST_RUNNER = 'chatbot_project.test_runner.ChatbotTestRunner'
 
 # Default primary key field type
 # https://docs.djangoproject.com/en/5.2/ref/settings/#default-auto-field
@@ -129,3 +147,41 @@ DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
 # Configurações do CSRF
 CSRF_COOKIE_SECURE = False
 CSRF_COOKIE_SAMESITE = 'Lax'
+
+# Tabela de regras compilada (manage.py compile_rules), mapeada em memória e
+# compartilhada entre os workers. Sem arquivo as regras vêm do banco.
+CHAT_RULES_FILE = os.environ.get('CHAT_RULES_FILE')
+
+# Intervalo (segundos) entre verificações de nova versão do arquivo de regras
+CHAT_RULES_CHECK_INTERVAL = 1.0
+
+# Atraso artificial (segundos) antes de cada resposta do bot
+CHAT_RESPONSE_DELAY = 0.5
+
+# Máximo de mensagens devolvidas por api/history/ (as mais recentes);
+# acima de 500 (ou None, sem limite) o histórico é enviado em streaming
+CHAT_HISTORY_LIMIT = 100
+
+# Limites de api/chat/, verificados antes do parsing do JSON
+CHAT_MAX_BODY_SIZE = 4096
+CHAT_MAX_MESSAGE_LENGTH = 500
+
+# Provedores que preenchem os placeholders das respostas por categoria
+# (ex.: "Agora são {hora}."). O clima vem do arquivo JSON CHAT_WEATHER_FILE;
+# sem ele, o clima fixo de StubWeatherProvider só é usado com DEBUG (e nos
+# testes), para não responder aos usuários com um clima inventado.
+CHAT_WEATHER_FILE = os.environ.get('CHAT_WEATHER_FILE')
+CHAT_RESPONSE_PROVIDERS = {
+    'time': 'chat.providers.ClockProvider',
+}
+if CHAT_WEATHER_FILE:
+    CHAT_RESPONSE_PROVIDERS['weather'] = 'chat.providers.WeatherFileProvider'
+elif DEBUG:
+    CHAT_RESPONSE_PROVIDERS['weather'] = 'chat.providers.StubWeatherProvider'
+
+# Clientes: tempo (segundos) e número máximo de entradas em cache da
+# resolução host/slug -> cliente e memória máxima (bytes) dos índices de
+# regras compilados por cliente
+CHAT_TENANT_CACHE_TTL = 5
+CHAT_TENANT_CACHE_SIZE = 1024
+CHAT_RULE_INDEX_BUDGET = 64 * 1024 * 1024
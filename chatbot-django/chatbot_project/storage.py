@@ -0,0 +1,31 @@
+"""
+Armazenamento dos arquivos estáticos do projeto.
+
+No collectstatic os arquivos CSS/JS são minificados, recebem o hash do
+conteúdo no nome (ManifestStaticFilesStorage) e são pré-comprimidos em
+gzip/brotli pelo WhiteNoise, que os serve com cache de longo prazo.
+"""
+import os
+
+import rcssmin
+import rjsmin
+from django.core.files.base import ContentFile
+from whitenoise.storage import CompressedManifestStaticFilesStorage
+
+
+class MinifiedManifestStaticFilesStorage(CompressedManifestStaticFilesStorage):
+    """
+    Storage que minifica CSS e JS antes de gerar o hash e a compressão
+    """
+    minifiers = {
+        '.css': rcssmin.cssmin,
+        '.js': rjsmin.jsmin,
+    }
+
+    def _save(self, name, content):
+        minify = self.minifiers.get(os.path.splitext(name)[1])
+        if minify and '.min.' not in os.path.basename(name):
+            content.seek(0)
+            source = content.read().decode('utf-8')
+            content = ContentFile(minify(source).encode('utf-8'))
+        return super()._save(name, content)
@@ -0,0 +1,26 @@
+from django.conf import settings
+from django.test import override_settings
+from django.test.runner import DiscoverRunner
+
+
+class ChatbotTestRunner(DiscoverRunner):
+    """
+    Runner dos testes: usa o storage simples de arquivos estáticos
+
+    O storage de produção exige o manifest gerado pelo collectstatic; os
+    testes que precisam dele o ativam explicitamente.
+    """
+
+    def setup_test_environment(self, **kwargs):
+        super().setup_test_environment(**kwargs)
+        self._static_storage = override_settings(STORAGES={
+            **settings.STORAGES,
+            'staticfiles': {
+                'BACKEND': 'django.contrib.staticfiles.storage.StaticFilesStorage',
+            },
+        })
+        self._static_storage.enable()
+
+    def teardown_test_environment(self, **kwargs):
+        self._static_storage.disable()
+        super().teardown_test_environment(**kwargs)
@@ -27,6 +27,17 @@ class DjangoChatBot {
     // Configurar CSRF token para Django
     setupCSRF() {
         this.csrfToken = document.querySelector('meta[name="csrf-token"]').getAttribute('content');
+
+        // URLs da API geradas pelo Django (incluem o prefixo do cliente, se houver)
+        this.apiUrls = {
+            chat: document.body.dataset.apiChat || '/api/chat/',
+            clear: document.body.dataset.apiClear || '/api/clear/',
+            history: document.body.dataset.apiHistory || '/api/history/'
+        };
+
+        // Uma sessão por cliente: sites /t/<slug>/ compartilham a origem e o localStorage
+        const prefix = this.apiUrls.chat.replace(/api\/chat\/$/, '');
+        this.sessionKey = prefix === '/' ? 'django-chat-session-id' : `django-chat-session-id:${prefix}`;
     }
 
     // Vincular eventos
@@ -81,7 +92,7 @@ class DjangoChatBot {
     // Carregar histórico da sessão
     async loadHistory() {
         try {
-            const response = await fetch('/api/history/', {
+            const response = await fetch(this.apiUrls.history, {
                 method: 'GET',
                 headers: {
                     'X-CSRFToken': this.csrfToken,
@@ -153,7 +164,7 @@ class DjangoChatBot {
 
     // Enviar mensagem para o servidor Django
     async sendToServer(message) {
-        const response = await fetch('/api/chat/', {
+        const response = await fetch(this.apiUrls.chat, {
             method: 'POST',
             headers: {
                 'Content-Type': 'application/json',
@@ -175,10 +186,10 @@ class DjangoChatBot {
 
     // Obter ou gerar ID da sessão
     getSessionId() {
-        let sessionId = localStorage.getItem('django-chat-session-id');
+        let sessionId = localStorage.getItem(this.sessionKey);
         if (!sessionId) {
             sessionId = this.generateUUID();
-            localStorage.setItem('django-chat-session-id', sessionId);
+            localStorage.setItem(this.sessionKey, sessionId);
         }
         return sessionId;
     }
@@ -280,7 +291,7 @@ class DjangoChatBot {
         
         if (confirmed) {
             try {
-                const response = await fetch('/api/clear/', { 
+                const response = await fetch(this.apiUrls.clear, { 
                     method: 'POST',
                     headers: {
                         'X-CSRFToken': this.csrfToken,
@@ -295,7 +306,7 @@ class DjangoChatBot {
                     }
                     
                     this.messageHistory = [];
-                    localStorage.removeItem('django-chat-session-id');
+                    localStorage.removeItem(this.sessionKey);
                     this.showNotification('Conversa limpa com sucesso!', 'success');
                 } else {
                     throw new Error('Erro ao limpar conversa');
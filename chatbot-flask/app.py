@@ -1,8 +1,27 @@
 from flask import Flask, render_template, request, jsonify
+from flask.json.provider import JSONProvider
+from werkzeug.exceptions import RequestEntityTooLarge
 import random
 import time
 
+import codec
+
+
+class CodecJSONProvider(JSONProvider):
+    """Faz o jsonify usar o codec do chat (orjson quando disponível)"""
+
+    def dumps(self, obj, **kwargs):
+        return codec.dumps(obj).decode('utf-8')
+
+    def loads(self, s, **kwargs):
+        return codec.loads(s)
+
+
 app = Flask(__name__)
+app.json = CodecJSONProvider(app)
+# Um byte a mais que o limite do codec: corpos chunked (sem Content-Length)
+# acima do limite chegam ao codec com esse byte extra e são rejeitados com 413
+app.config['MAX_CONTENT_LENGTH'] = codec.MAX_BODY_SIZE + 1
 
 # Respostas predefinidas do chatbot (você pode expandir isso)
 RESPOSTAS_BOT = {
@@ -74,8 +93,10 @@ def index():
 def chat():
     """Endpoint para processar mensagens do chat"""
     try:
-        data = request.get_json()
-        mensagem_usuario = data.get('message', '').strip()
+        # Limites verificados antes de ler e decodificar o corpo
+        codec.check_content_length(request.content_length)
+        data = codec.decode_chat_request(request.get_data(cache=False))
+        mensagem_usuario = data['message']
         
         if not mensagem_usuario:
             return jsonify({'error': 'Mensagem vazia'}), 400
@@ -91,6 +112,10 @@ def chat():
             'timestamp': time.time()
         })
     
+    except codec.CodecError as e:
+        return jsonify({'error': e.message}), e.status
+    except RequestEntityTooLarge:
+        return jsonify({'error': 'Requisição muito grande'}), 413
     except Exception as e:
         return jsonify({'error': 'Erro interno do servidor'}), 500
 
@@ -0,0 +1,109 @@
+"""
+Testes do chatbot Flask
+
+Executar com: python -m unittest
+"""
+import io
+import json
+import unittest
+from pathlib import Path
+
+import codec
+from app import CodecJSONProvider, app
+
+DJANGO_CODEC = Path(__file__).resolve().parent.parent / 'chatbot-django' / 'chat' / 'codec.py'
+
+
+class ChatAPITests(unittest.TestCase):
+    """Testes do endpoint /chat e dos limites das requisições"""
+
+    def setUp(self):
+        self.client = app.test_client()
+
+    def post(self, body, **kwargs):
+        return self.client.post('/chat', data=body, content_type='application/json', **kwargs)
+
+    def post_chunked(self, body):
+        """Enviar o corpo sem Content-Length (Transfer-Encoding: chunked)"""
+        return self.client.post(
+            '/chat',
+            input_stream=io.BytesIO(body),
+            content_type='application/json',
+            headers={'Transfer-Encoding': 'chunked'},
+            environ_overrides={'wsgi.input_terminated': True},
+        )
+
+    def test_chat_ok(self):
+        """Teste de mensagem válida"""
+        response = self.post(json.dumps({'message': 'Olá'}))
+        self.assertEqual(response.status_code, 200)
+        self.assertIn('response', response.get_json())
+
+    def test_oversized_body_rejected(self):
+        """Teste de 413 pelo Content-Length, antes de ler o corpo"""
+        body = json.dumps({'message': 'a' * codec.MAX_BODY_SIZE})
+        response = self.post(body)
+        self.assertEqual(response.status_code, 413)
+        self.assertEqual(response.get_json(), {'error': 'Requisição muito grande'})
+
+    def test_oversized_chunked_body_rejected(self):
+        """Teste de 413 (e não JSON inválido) para corpo chunked acima do limite"""
+        body = json.dumps({'message': 'a' * codec.MAX_BODY_SIZE}).encode()
+        response = self.post_chunked(body)
+        self.assertEqual(response.status_code, 413)
+        self.assertEqual(response.get_json(), {'error': 'Requisição muito grande'})
+
+        response = self.post_chunked(json.dumps({'message': 'Olá'}).encode())
+        self.assertEqual(response.status_code, 200)
+
+    def test_body_at_limit_accepted(self):
+        """Teste de corpo com exatamente o tamanho máximo"""
+        padding = codec.MAX_BODY_SIZE - len(json.dumps({'message': 'oi', 'x': ''}))
+        body = json.dumps({'message': 'oi', 'x': ' ' * padding}).encode()
+        self.assertEqual(len(body), codec.MAX_BODY_SIZE)
+        self.assertEqual(self.post_chunked(body).status_code, 200)
+
+    def test_message_too_long(self):
+        """Teste de mensagem acima de MAX_MESSAGE_LENGTH"""
+        response = self.post(json.dumps({'message': 'a' * (codec.MAX_MESSAGE_LENGTH + 1)}))
+        self.assertEqual(response.status_code, 413)
+
+    def test_invalid_json(self):
+        """Teste de corpo que não é JSON"""
+        response = self.post('não é json')
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(response.get_json(), {'error': 'JSON inválido'})
+
+
+class CodecTests(unittest.TestCase):
+    """Testes do codec e do provedor JSON do Flask"""
+
+    def test_json_provider_uses_codec(self):
+        """Teste de jsonify e get_json passando pelo codec"""
+        self.assertIsInstance(app.json, CodecJSONProvider)
+        data = {'mensagem': 'olá', 'itens': [1, 2.5, None, True]}
+        self.assertEqual(app.json.dumps(data), codec.dumps(data).decode('utf-8'))
+        self.assertEqual(app.json.loads(app.json.dumps(data)), data)
+
+        with app.test_request_context():
+            response = app.json.response(data)
+        self.assertEqual(response.mimetype, 'application/json')
+        self.assertEqual(response.get_data(), codec.dumps(data))
+
+    def test_codec_matches_django_copy(self):
+        """Teste de que codec.py é igual ao chat/codec.py do chatbot-django"""
+        if not DJANGO_CODEC.exists():
+            self.skipTest('chatbot-django não encontrado')
+
+        def lines(path):
+            # A única diferença permitida é a linha que aponta para a outra cópia
+            return [
+                line for line in path.read_text(encoding='utf-8').splitlines()
+                if not line.startswith('O mesmo módulo existe no')
+            ]
+
+        self.assertEqual(lines(Path(codec.__file__)), lines(DJANGO_CODEC))
+
+
+if __name__ == '__main__':
+    unittest.main()